@@ -0,0 +1,66 @@
+"""
+Admin endpoints for on-demand profiling of live requests.
+
+Disabled (404) unless ADMIN_TOKEN is set; every call must send it in the
+``X-Admin-Token`` header.
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel, Field
+
+from app.config import ADMIN_TOKEN
+from models.engine import profiler
+
+router = APIRouter(prefix="/admin")
+
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+class ProfileRequest(BaseModel):
+    requests: int = Field(1, ge=1, le=100, description="Number of requests to capture")
+    sample_rate: Optional[float] = Field(None, gt=0.0, le=1.0,
+                                         description="Capture only this fraction of requests until done")
+
+
+@router.post("/profile", dependencies=[Depends(_require_admin)])
+async def start_profiling(request: ProfileRequest):
+    """Capture torch.profiler + Python sampling profiles of upcoming /predict requests."""
+    profiler.arm(requests=request.requests, sample_rate=request.sample_rate)
+    return JSONResponse(profiler.status())
+
+
+@router.get("/profile", dependencies=[Depends(_require_admin)])
+async def profiling_status():
+    """Whether capture is armed and how many requests remain."""
+    return JSONResponse(profiler.status())
+
+
+@router.delete("/profile", dependencies=[Depends(_require_admin)])
+async def stop_profiling():
+    """Disarm capture; a request already being captured still finishes."""
+    profiler.disarm()
+    return JSONResponse(profiler.status())
+
+
+@router.get("/profiles", dependencies=[Depends(_require_admin)])
+async def list_profiles():
+    """Captured Chrome trace (.trace.json) and speedscope (.speedscope.json) files."""
+    return JSONResponse({"profiles": profiler.list_profiles()})
+
+
+@router.get("/profiles/{name}", dependencies=[Depends(_require_admin)])
+async def download_profile(name: str):
+    """Download one captured profile file."""
+    path = os.path.join(profiler.output_dir, os.path.basename(name))
+    if name != os.path.basename(name) or not name.endswith('.json') or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=name)
@@ -0,0 +1,310 @@
+"""
+Asynchronous job API.
+
+``POST /jobs`` persists the upload and returns a job id straight away;
+background workers drain the SQLite-backed queue and ``GET /jobs/{id}``
+reports status and result. An optional callback URL is notified when the
+job finishes.
+
+With ``INFERENCE_BACKEND=queue`` no workers run in the API process: the
+same queue (SQLite, or Redis via ``BROKER_URL``) is drained by
+``worker.py`` processes, which report their health to ``GET /workers``.
+"""
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Optional
+from urllib.parse import urlparse
+
+from fastapi import APIRouter, UploadFile, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from api.routes import _validate_upload, _run_inference
+from app.config import (
+    JOB_DB_PATH, JOB_UPLOAD_DIR, JOB_WORKERS, JOB_MAX_PENDING,
+    JOB_MAX_ATTEMPTS, JOB_POLL_INTERVAL, JOB_RESULT_TTL, CALLBACK_TIMEOUT, CALLBACK_ALLOWED_HOSTS,
+    MAX_UPLOAD_SIZE,
+    INFERENCE_BACKEND, BROKER_URL, WORKER_HEARTBEAT_TIMEOUT,
+)
+from utils.job_queue import JobQueue, PENDING, RUNNING, SUCCEEDED, FAILED, open_job_queue
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Created on first use so importing this module never touches the filesystem
+_queue = None
+_queue_lock = threading.Lock()
+_workers = []
+_wakeup = threading.Event()
+_stop = threading.Event()
+# Finished jobs are purged at most this often (seconds)
+_PURGE_INTERVAL = 60
+_last_purge = 0.0
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue, opening the database or broker on first use."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = open_job_queue(BROKER_URL, JOB_DB_PATH, max_attempts=JOB_MAX_ATTEMPTS)
+        return _queue
+
+
+def purge_finished_jobs(queue: JobQueue):
+    """Delete jobs finished more than JOB_RESULT_TTL ago, at most every _PURGE_INTERVAL seconds."""
+    global _last_purge
+    now = time.time()
+    if JOB_RESULT_TTL <= 0 or now - _last_purge < _PURGE_INTERVAL:
+        return
+    _last_purge = now
+    try:
+        purged = queue.purge_finished(JOB_RESULT_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to purge finished jobs: {str(e)}")
+        return
+    if purged:
+        logger.info(f"Purged {purged} finished job(s)")
+
+
+def _save_upload(video: UploadFile, path: str):
+    """Stream an upload to disk, enforcing MAX_UPLOAD_SIZE."""
+    written = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = video.file.read(1024 * 1024)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > MAX_UPLOAD_SIZE:
+                raise HTTPException(status_code=413, detail="Video exceeds maximum upload size")
+            f.write(chunk)
+
+
+def _check_callback_url(url: str):
+    """Raise ValueError unless ``url`` is http(s) and its host resolves only to public addresses.
+
+    Keeps clients from making the server call loopback, link-local (cloud
+    metadata) or private-network services. Hosts in CALLBACK_ALLOWED_HOSTS
+    skip the address check. Resolves DNS, so call it off the event loop.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parsed.hostname.lower()
+    if host in CALLBACK_ALLOWED_HOSTS:
+        return
+    try:
+        infos = socket.getaddrinfo(host, parsed.port or (443 if parsed.scheme == 'https' else 80),
+                                   proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        raise ValueError("callback_url host does not resolve")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError("callback_url must point at a public host")
+
+
+def _send_callback(job: dict):
+    """POST the finished job to its callback URL; failures are only logged."""
+    import requests
+
+    try:
+        # Re-checked here: the name may resolve differently than at submission
+        _check_callback_url(job["callback_url"])
+    except ValueError as e:
+        logger.warning(f"Callback for job {job['id']} skipped: {str(e)}")
+        return
+    payload = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "result": job.get("result"),
+        "error": job.get("error"),
+    }
+    try:
+        # Redirects are not followed, since they could lead to a host that was never checked
+        requests.post(job["callback_url"], json=payload, timeout=CALLBACK_TIMEOUT, allow_redirects=False)
+    except Exception as e:
+        logger.warning(f"Callback for job {job['id']} failed: {str(e)}")
+
+
+def _process_job(queue: JobQueue, job: dict) -> bool:
+    """Run one claimed job, record its outcome and notify its callback; True on success.
+
+    A job turned away for lack of memory (503) is not the clip's fault, so it
+    goes back on the queue until it runs out of attempts.
+    """
+    job_id = job["id"]
+    logger.info(f"Running job {job_id} (attempt {job['attempts']})")
+    succeeded = requeued = False
+    try:
+        result = _run_inference(job["video_path"], job["clinical_condition"], job.get("tta_views") or 1)
+        queue.complete(job_id, result)
+        succeeded = True
+    except HTTPException as e:
+        if e.status_code == 503 and job["attempts"] < queue.max_attempts:
+            logger.warning(f"Job {job_id} requeued: {e.detail}")
+            queue.requeue(job_id)
+            requeued = True
+        else:
+            logger.error(f"Job {job_id} failed: {e.detail}")
+            queue.fail(job_id, e.detail, error_code=e.status_code)
+    except MemoryError as e:
+        logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+        queue.fail(job_id, "Insufficient memory for prediction", error_code=500)
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+        queue.fail(job_id, f"Inference error: {str(e)}", error_code=500)
+    finally:
+        # A requeued job still needs its video
+        if not requeued and os.path.exists(job["video_path"]):
+            os.remove(job["video_path"])
+
+    if job.get("callback_url") and not requeued:
+        _send_callback(queue.get(job_id))
+    return succeeded
+
+
+def _worker_loop():
+    queue = get_job_queue()
+    while not _stop.is_set():
+        purge_finished_jobs(queue)
+        try:
+            job = queue.claim()
+        except Exception as e:
+            logger.error(f"Failed to claim job: {str(e)}", exc_info=True)
+            job = None
+        if job is None:
+            # Sleep until a new job is submitted or the poll interval elapses
+            _wakeup.wait(JOB_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        _process_job(queue, job)
+
+
+def start_job_workers(num_workers: int = JOB_WORKERS):
+    """Requeue interrupted jobs and start background worker threads."""
+    if INFERENCE_BACKEND == 'queue':
+        logger.info("INFERENCE_BACKEND=queue: jobs are processed by worker.py processes")
+        return
+    if _workers or num_workers <= 0:
+        return
+    get_job_queue().recover_running()
+    _stop.clear()
+    for i in range(num_workers):
+        t = threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+        t.start()
+        _workers.append(t)
+    logger.info(f"Started {num_workers} job worker(s)")
+
+
+def stop_job_workers(timeout: float = 5.0):
+    """Signal worker threads to exit after their current job."""
+    _stop.set()
+    _wakeup.set()
+    for t in _workers:
+        t.join(timeout)
+    _workers.clear()
+
+
+def _status_counts(queue: JobQueue, statuses) -> dict:
+    return {status: queue.count(status) for status in statuses}
+
+
+def _job_response(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(
+    video: UploadFile,
+    clinical_condition: str = Form(...),
+    callback_url: Optional[str] = Form(None),
+):
+    """Queue a gait analysis job and return its id immediately."""
+    _validate_upload(video, clinical_condition)
+
+    if callback_url:
+        try:
+            await run_in_threadpool(_check_callback_url, callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # SQLite calls can wait on a worker's write lock, so none run on the event loop
+    queue = get_job_queue()
+    if await run_in_threadpool(queue.count, PENDING) >= JOB_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Job queue is full, retry later")
+
+    job_id = uuid.uuid4().hex
+    video_path = os.path.join(JOB_UPLOAD_DIR, f"{job_id}_{os.path.basename(video.filename)}")
+    try:
+        await run_in_threadpool(_save_upload, video, video_path)
+    except HTTPException:
+        if os.path.exists(video_path):
+            os.remove(video_path)
+        raise
+    except Exception as e:
+        logger.error(f"Error saving video: {str(e)}")
+        if os.path.exists(video_path):
+            os.remove(video_path)
+        raise HTTPException(status_code=500, detail="Error processing video upload")
+
+    await run_in_threadpool(queue.enqueue, video_path, clinical_condition, callback_url=callback_url, job_id=job_id)
+    _wakeup.set()
+
+    return JSONResponse(
+        {"job_id": job_id, "status": PENDING, "status_url": f"/jobs/{job_id}"},
+        status_code=202,
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return status, and result once finished, for a queued job."""
+    job = await run_in_threadpool(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(_job_response(job))
+
+
+@router.get("/jobs")
+async def job_queue_status():
+    """Summary counts of jobs by state."""
+    counts = await run_in_threadpool(_status_counts, get_job_queue(), (PENDING, RUNNING, SUCCEEDED, FAILED))
+    return JSONResponse(counts)
+
+
+def worker_health(queue: JobQueue) -> list:
+    """Registered inference workers, each marked alive if it heartbeated recently."""
+    now = time.time()
+    workers = []
+    for worker in queue.workers():
+        age = now - worker["heartbeat_at"]
+        workers.append({**worker, "alive": age <= WORKER_HEARTBEAT_TIMEOUT, "heartbeat_age_s": round(age, 1)})
+    return workers
+
+
+@router.get("/workers")
+async def worker_status():
+    """Inference backend, queue depth, and per-worker health from heartbeats."""
+    queue = get_job_queue()
+    workers = await run_in_threadpool(worker_health, queue)
+    return JSONResponse({
+        "backend": INFERENCE_BACKEND,
+        "queue": await run_in_threadpool(_status_counts, queue, (PENDING, RUNNING)),
+        "alive": sum(1 for w in workers if w["alive"]),
+        "workers": workers,
+    })
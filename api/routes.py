@@ -1,23 +1,27 @@
 from typing import Dict, Optional
-from fastapi import APIRouter, UploadFile, Form, HTTPException
+from fastapi import APIRouter, UploadFile, Form, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
+import asyncio
 import os
 import logging
-import gc
-
-# Lazy imports: defer heavy dependencies (torch, transformers) until actually needed
-try:
-    import torch
-    _TORCH_AVAILABLE = True
-except ImportError:
-    torch = None
-    _TORCH_AVAILABLE = False
-
-from utils.video_utils import process_video
-from utils.clinical_utils import ClinicalEmbedder
-from models.load_model import load_student_model
-from app.config import DEVICE, NUM_FRAMES, FRAME_SIZE, CHUNK_SIZE
-from models.class_mapping import class_mapping, clinical_descriptions
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# torch and the video stack are imported by the engine on first use, so
+# importing this router (and binding the port) stays fast.
+from models.engine import get_engine
+from utils.admission import AdmissionError, AdmissionTimeout, ClipTooLarge
+from utils.single_flight import SingleFlight
+from utils.stream_decode import ByteStream, StreamingUnsupported
+from utils.job_queue import PENDING, RUNNING, SUCCEEDED, FAILED
+from app.config import (
+    TEMP_UPLOAD_DIR, MAX_UPLOAD_SIZE, TTA_MAX_VIEWS, INFERENCE_BACKEND, JOB_UPLOAD_DIR, JOB_MAX_PENDING,
+    QUEUE_RESULT_TIMEOUT, QUEUE_POLL_INTERVAL, STREAM_DECODE_WORKERS,
+)
+from models.class_mapping import clinical_descriptions
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -25,150 +29,316 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Initialize model and embedder (set MODEL_READY flag)
-# Deferred to first-use pattern: don't initialize at import time to allow
-# the module to be imported during build-time checks without expensive model loads.
-MODEL_READY = False
-embedder = None
-model = None
+# Coalesces identical /predict uploads that are in flight at the same time
+_inflight = SingleFlight()
+
+# /predict/stream decoders block on their upload for as long as it takes to
+# arrive, so they get threads of their own instead of the shared threadpool
+_stream_executor = ThreadPoolExecutor(max_workers=max(1, STREAM_DECODE_WORKERS), thread_name_prefix="stream-decode")
+_stream_slots = threading.BoundedSemaphore(max(1, STREAM_DECODE_WORKERS))
 
 def _ensure_model_loaded():
-    """Lazy-load model and embedder on first use."""
-    global MODEL_READY, embedder, model
-    if MODEL_READY or (embedder is not None and model is not None):
+    """Lazy-load model and embedder on first use.
+
+    Deferred to first use rather than import time so this module can be
+    imported during build-time checks without loading the model.
+    """
+    engine = get_engine()
+    if engine.ready:
         return
     try:
-        logger.info("Initializing embedder...")
-        embedder = ClinicalEmbedder()
-        logger.info("Embedder initialized. Loading model...")
-        model = load_student_model(num_classes=len(class_mapping))
-        logger.info("Model loaded successfully")
-        MODEL_READY = True
+        engine.load()
         logger.info("Model and embedder initialized successfully")
     except Exception as e:
-        MODEL_READY = False
         logger.error(f"Error initializing model: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Model initialization failed: {str(e)}")
 
-@router.post("/predict", response_model=Dict[str, Optional[Dict[str, float] | str]])
-async def predict(video: UploadFile, clinical_condition: str = Form(...)):
+
+async def _require_model():
+    """Load the model off the event loop; 503 while the startup warm-up/compile still runs.
+
+    Loading holds the engine's load lock for the whole warm-up, so waiting
+    on it inline would stall /health and /ready along with this request.
     """
-    Endpoint for gait analysis prediction.
-    Args:
-        video: Uploaded video file
-        clinical_condition: Clinical condition for analysis
-    Returns:
-        Dictionary containing prediction results and probabilities
+    if get_engine().loading:
+        raise HTTPException(status_code=503, detail="Model warming up", headers={"Retry-After": "5"})
+    await run_in_threadpool(_ensure_model_loaded)
+
+
+def _validate_upload(video: UploadFile, clinical_condition: str):
+    """Reject uploads that are not videos or lack a clinical description."""
+    if not video.filename or not video.content_type:
+        raise HTTPException(status_code=400, detail="Invalid video file")
+
+    # Accept common video content-types, but also tolerate application/octet-stream
+    content_type = (video.content_type or '').lower()
+    filename = (video.filename or '').lower()
+    is_video = (
+        content_type.startswith('video/') or
+        content_type == 'application/octet-stream' or
+        filename.endswith(('.mp4', '.mov', '.avi', '.mkv', '.webm'))
+    )
+    if not is_video:
+        raise HTTPException(status_code=400, detail="File must be a video")
+
+    # Validate clinical condition text
+    if not clinical_condition.strip():
+        raise HTTPException(status_code=400, detail="Clinical description cannot be empty")
+
+
+def _run_inference(video_path: str, clinical_condition: str, tta_views: int = 1) -> Dict:
+    """Run the full preprocess -> embed -> forward pipeline on a saved video.
+
+    Shared by the synchronous /predict endpoint and the background job
+    workers; forward passes go through the engine's micro-batcher, or run
+    as one stacked batch of augmented views when ``tta_views > 1``. Requests
+    the engine's memory admission turns away become 400/413/503 errors;
+    other errors propagate to the caller.
     """
+    _ensure_model_loaded()
     try:
-        # Ensure model is loaded on first use
-        _ensure_model_loaded()
-        
-        # Ensure model is ready
-        if not MODEL_READY:
-            raise HTTPException(status_code=503, detail="Model not ready")
-        # Validate video file
-        if not video.filename or not video.content_type:
-            raise HTTPException(status_code=400, detail="Invalid video file")
-        
-        # Accept common video content-types, but also tolerate application/octet-stream
-        content_type = (video.content_type or '').lower()
-        filename = (video.filename or '').lower()
-        is_video = (
-            content_type.startswith('video/') or
-            content_type == 'application/octet-stream' or
-            filename.endswith(('.mp4', '.mov', '.avi', '.mkv', '.webm'))
-        )
-        if not is_video:
-            raise HTTPException(status_code=400, detail="File must be a video")
+        if tta_views > 1:
+            return get_engine().predict_tta(video_path, clinical_condition, tta_views)
+        return get_engine().predict(video_path, clinical_condition)
+    except AdmissionError as e:
+        raise _admission_error(e)
+
+
+def _admission_error(e: AdmissionError) -> HTTPException:
+    """HTTP error for a request the engine's memory admission turned away."""
+    if isinstance(e, ClipTooLarge):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, AdmissionTimeout):
+        return HTTPException(status_code=503, detail=f"Server busy: {str(e)}", headers={"Retry-After": "5"})
+    return HTTPException(status_code=400, detail=str(e))
 
-        # Validate clinical condition text
-        if not clinical_condition.strip():
-            raise HTTPException(status_code=400, detail="Clinical description cannot be empty")
 
+async def _run_queued(video_path: str, clinical_condition: str, tta_views: int = 1) -> Dict:
+    """Hand a saved upload to the worker.py processes and wait for their result.
+
+    Used with INFERENCE_BACKEND=queue. The worker that runs the job deletes
+    the video; errors it recorded come back with their original status code.
+    """
+    # Imported here: api.jobs imports this module
+    from api.jobs import get_job_queue
+
+    queue = get_job_queue()
+    if await run_in_threadpool(queue.count, PENDING) >= JOB_MAX_PENDING:
+        os.remove(video_path)
+        raise HTTPException(status_code=503, detail="Inference queue is full, retry later", headers={"Retry-After": "5"})
+    job_id = await run_in_threadpool(queue.enqueue, video_path, clinical_condition, tta_views=tta_views)
+
+    deadline = asyncio.get_running_loop().time() + QUEUE_RESULT_TIMEOUT
+    while True:
+        job = await run_in_threadpool(queue.get, job_id)
+        if job["status"] == SUCCEEDED:
+            return job["result"]
+        if job["status"] == FAILED:
+            raise HTTPException(status_code=job.get("error_code") or 500, detail=job["error"])
+        if asyncio.get_running_loop().time() >= deadline:
+            # The job stays queued; its result can still be fetched later
+            raise HTTPException(status_code=504,
+                                detail=f"Timed out waiting for an inference worker; poll /jobs/{job_id}")
+        await asyncio.sleep(QUEUE_POLL_INTERVAL)
+
+
+async def _predict_contents(contents: bytes, filename: str, clinical_condition: str, tta_views: int = 1) -> Dict:
+    """Save upload bytes to a temp file, run inference and clean up."""
+    if INFERENCE_BACKEND == 'queue':
+        # Written where every worker can read it; the worker removes it
+        fd, video_path = tempfile.mkstemp(suffix=f"_{os.path.basename(filename)}", dir=JOB_UPLOAD_DIR)
+        with os.fdopen(fd, "wb") as f:
+            f.write(contents)
+        return await _run_queued(video_path, clinical_condition, tta_views)
+
+    try:
         # Create temp directory if it doesn't exist
-        os.makedirs("/tmp", exist_ok=True)
+        os.makedirs(TEMP_UPLOAD_DIR, exist_ok=True)
 
         # Save uploaded video temporarily with a unique name
-        video_path = f"/tmp/{hash(video.filename)}_{video.filename}"
+        fd, video_path = tempfile.mkstemp(suffix=f"_{os.path.basename(filename)}", dir=TEMP_UPLOAD_DIR)
         try:
-            contents = await video.read()
-            with open(video_path, "wb") as f:
+            with os.fdopen(fd, "wb") as f:
                 f.write(contents)
         except Exception as e:
             logger.error(f"Error saving video: {str(e)}")
             raise HTTPException(status_code=500, detail="Error processing video upload")
 
         try:
-            logger.info("Processing video...")
-            # Preprocess video with chunked processing for memory efficiency
-            video_tensor = process_video(
-                video_path, 
-                num_frames=NUM_FRAMES, 
-                frame_size=FRAME_SIZE,
-                chunk_size=CHUNK_SIZE
-            ).to(DEVICE)
-            logger.info(f"Video tensor shape: {video_tensor.shape}")
-
-            logger.info("Generating clinical embedding...")
-            # Get clinical embedding from user's description
-            clinical_embed = embedder.get_embedding(clinical_condition).to(DEVICE)
-            logger.info(f"Clinical embedding shape: {clinical_embed.shape}")
-
-            logger.info("Running inference...")
-            # Run inference
-            with torch.no_grad():
-                logits = model(video_tensor, clinical_embed)
-                probs = torch.softmax(logits, dim=1)
-                pred_idx = torch.argmax(probs, dim=1).item()
-                pred_class = list(class_mapping.keys())[pred_idx]
-            
-            logger.info(f"Prediction: {pred_class}")
-
-            # Prepare response
-            response = {
-                "predicted_class": pred_class,
-                "probabilities": {
-                    k: float(probs[0, v]) for k, v in class_mapping.items()
-                }
-            }
-            
-            # Aggressive memory cleanup
-            del video_tensor, clinical_embed, logits, probs
-            gc.collect()
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-            
-            # Clean up temp file
-            if os.path.exists(video_path):
-                os.remove(video_path)
-            
-            return response
+            # Run off the event loop so concurrent requests can share a batch
+            return await run_in_threadpool(_run_inference, video_path, clinical_condition, tta_views)
 
+        except HTTPException:
+            raise
         except MemoryError as e:
+            # Admission control should prevent this; the estimate was too low
             logger.error(f"Memory error during inference: {str(e)}", exc_info=True)
-            gc.collect()
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
             raise HTTPException(status_code=500, detail="Insufficient memory for prediction")
         except Exception as e:
             logger.error(f"Error during inference: {str(e)}", exc_info=True)
-            # Cleanup on error
-            gc.collect()
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
             raise HTTPException(status_code=500, detail=f"Inference error: {str(e)}")
+    finally:
+        # Ensure temp file is cleaned up
+        if 'video_path' in locals() and os.path.exists(video_path):
+            os.remove(video_path)
+
+
+@router.post("/predict", response_model=Dict[str, Optional[Dict[str, float] | str]])
+async def predict(video: UploadFile, clinical_condition: str = Form(...), tta_views: int = Form(1)):
+    """
+    Endpoint for gait analysis prediction.
+
+    Identical uploads (same bytes, clinical text, TTA views and model
+    version) that arrive while one is already being processed wait for that
+    result instead of running their own decode and forward pass.
+
+    Args:
+        video: Uploaded video file
+        clinical_condition: Clinical condition for analysis
+        tta_views: Test-time augmentation views averaged together (1 = off,
+            at most TTA_MAX_VIEWS): identity, horizontal flip, one-frame
+            temporal shift, slight center crop
+    Returns:
+        Dictionary containing prediction results and probabilities
+    """
+    try:
+        # With INFERENCE_BACKEND=queue the model lives in the worker processes
+        if INFERENCE_BACKEND != 'queue':
+            # Ensure model is loaded on first use
+            await _require_model()
+
+            # Ensure model is ready
+            if not get_engine().ready:
+                raise HTTPException(status_code=503, detail="Model not ready")
+        _validate_upload(video, clinical_condition)
+        if not 1 <= tta_views <= TTA_MAX_VIEWS:
+            raise HTTPException(status_code=400, detail=f"tta_views must be between 1 and {TTA_MAX_VIEWS}")
+
+        try:
+            contents = await video.read()
+        except Exception as e:
+            logger.error(f"Error reading video: {str(e)}")
+            raise HTTPException(status_code=500, detail="Error processing video upload")
+
+        key = (hashlib.sha256(contents).hexdigest(), clinical_condition, tta_views, get_engine().model_version)
+        return await _inflight.do_async(
+            key, lambda: _predict_contents(contents, video.filename, clinical_condition, tta_views)
+        )
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def _run_stream_inference(source: ByteStream, clinical_condition: str) -> Dict:
+    try:
+        return get_engine().predict_stream(source, clinical_condition)
+    except AdmissionError as e:
+        raise _admission_error(e)
+
+
+@router.post("/predict/stream", response_model=Dict[str, Optional[Dict[str, float] | str]])
+async def predict_stream(request: Request, clinical_condition: str = Query(...)):
+    """
+    Gait prediction on a raw video request body, decoded while it uploads.
+
+    Send the video bytes as the body (e.g. ``Content-Type: video/webm``) and
+    the clinical text as a query parameter. Fragmented MP4 and WebM are
+    demuxed and sampled as packets arrive, so latency approaches
+    max(upload, decode) instead of their sum. Containers that need seeking
+    (MP4 with the index at the end) are decoded from the spooled upload once
+    it completes. Uploads are not coalesced like /predict. At most
+    STREAM_DECODE_WORKERS streams are decoded at once; more get a 503. With
+    INFERENCE_BACKEND=queue the complete upload is handed to the workers.
+    """
+    if not clinical_condition.strip():
+        raise HTTPException(status_code=400, detail="Clinical description cannot be empty")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail="Video exceeds maximum upload size")
+    if INFERENCE_BACKEND == 'queue':
+        return await _predict_stream_queued(request, clinical_condition)
+    await _require_model()
+    if not _stream_slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Too many streams being decoded, retry later",
+                            headers={"Retry-After": "5"})
+
+    os.makedirs(TEMP_UPLOAD_DIR, exist_ok=True)
+    fd, video_path = tempfile.mkstemp(suffix="_stream", dir=TEMP_UPLOAD_DIR)
+    source = ByteStream()
+    # Decoding starts now, in a stream decoder thread, and blocks on bytes as they arrive;
+    # the slot is freed when that thread is done, even if this request is cancelled first
+    decoder = _stream_executor.submit(_run_stream_inference, source, clinical_condition)
+    decoder.add_done_callback(lambda _: _stream_slots.release())
+    decoding = asyncio.wrap_future(decoder)
+    try:
+        received = 0
+        try:
+            with os.fdopen(fd, "wb") as spool:
+                async for chunk in request.stream():
+                    received += len(chunk)
+                    if received > MAX_UPLOAD_SIZE:
+                        raise HTTPException(status_code=413, detail="Video exceeds maximum upload size")
+                    # Spooled too, in case the container turns out not to be streamable
+                    spool.write(chunk)
+                    if not source.has_room():
+                        # The decoder is behind (or waiting for memory): stop reading the upload
+                        await source.wait_for_room()
+                    source.feed(chunk)
+        except BaseException as e:
+            source.close(error=ConnectionAbortedError("Upload aborted"))
+            await asyncio.gather(decoding, return_exceptions=True)
+            if isinstance(e, HTTPException) or not isinstance(e, Exception):
+                raise
+            logger.error(f"Error receiving video stream: {str(e)}")
+            raise HTTPException(status_code=400, detail="Error receiving video upload")
+        source.close()
+        if not received:
+            await asyncio.gather(decoding, return_exceptions=True)
+            raise HTTPException(status_code=400, detail="Empty video upload")
+
+        try:
+            return await decoding
+        except StreamingUnsupported as e:
+            logger.info(f"Stream not decodable progressively ({str(e)}); decoding the complete upload")
+            return await run_in_threadpool(_run_inference, video_path, clinical_condition)
+    except HTTPException:
+        raise
+    except MemoryError as e:
+        logger.error(f"Memory error during inference: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Insufficient memory for prediction")
+    except Exception as e:
+        logger.error(f"Error during inference: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Inference error: {str(e)}")
     finally:
-        # Ensure temp file is cleaned up
-        if 'video_path' in locals() and os.path.exists(video_path):
+        if os.path.exists(video_path):
             os.remove(video_path)
 
+
+async def _predict_stream_queued(request: Request, clinical_condition: str) -> Dict:
+    """Spool a raw request body to JOB_UPLOAD_DIR and run it on the workers."""
+    fd, video_path = tempfile.mkstemp(suffix="_stream", dir=JOB_UPLOAD_DIR)
+    try:
+        received = 0
+        with os.fdopen(fd, "wb") as spool:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > MAX_UPLOAD_SIZE:
+                    raise HTTPException(status_code=413, detail="Video exceeds maximum upload size")
+                spool.write(chunk)
+        if not received:
+            raise HTTPException(status_code=400, detail="Empty video upload")
+    except BaseException as e:
+        os.remove(video_path)
+        if isinstance(e, HTTPException) or not isinstance(e, Exception):
+            raise
+        logger.error(f"Error receiving video stream: {str(e)}")
+        raise HTTPException(status_code=400, detail="Error receiving video upload")
+    return await _run_queued(video_path, clinical_condition)
+
+
 @router.get("/health")
 async def health_check():
     """Simple health check to indicate app is running."""
@@ -177,14 +347,28 @@ async def health_check():
 
 @router.get("/ready")
 async def readiness_check():
-    """Readiness probe: returns 200 when model is loaded, 503 otherwise."""
+    """Readiness probe: returns 200 when model is loaded, 503 otherwise.
+
+    With INFERENCE_BACKEND=queue, ready once any inference worker is alive.
+    """
+    if INFERENCE_BACKEND == 'queue':
+        from api.jobs import get_job_queue, worker_health
+
+        if any(w["alive"] for w in await run_in_threadpool(worker_health, get_job_queue())):
+            return JSONResponse({"ready": True})
+        return JSONResponse({"ready": False, "reason": "no live inference workers"}, status_code=503)
+
+    # Don't block the probe on a warm-up/compile already running at startup
+    if get_engine().loading:
+        return JSONResponse({"ready": False, "reason": "model warming up"}, status_code=503)
+
     # Trigger lazy loading on readiness check
     try:
-        _ensure_model_loaded()
+        await run_in_threadpool(_ensure_model_loaded)
     except:
         pass
     
-    if MODEL_READY:
+    if get_engine().ready:
         return JSONResponse({"ready": True})
     else:
         return JSONResponse({"ready": False, "reason": "model not loaded"}, status_code=503)
@@ -195,4 +379,24 @@ async def list_conditions():
     """List available clinical conditions and their descriptions."""
     return JSONResponse({
         "conditions": clinical_descriptions
-    })
\ No newline at end of file
+    })
+
+
+@router.get("/metrics")
+async def metrics():
+    """Inference counters: batching, cascade stage exit rates and request coalescing.
+
+    With INFERENCE_BACKEND=queue: queue depth and each worker's last reported counters.
+    """
+    if INFERENCE_BACKEND == 'queue':
+        from api.jobs import _status_counts, get_job_queue, worker_health
+
+        queue = get_job_queue()
+        return JSONResponse({
+            "queue": await run_in_threadpool(_status_counts, queue, (PENDING, RUNNING)),
+            "workers": await run_in_threadpool(worker_health, queue),
+            "coalescing": _inflight.stats(),
+        })
+    stats = get_engine().metrics()
+    stats["coalescing"] = _inflight.stats()
+    return JSONResponse(stats)
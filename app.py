@@ -3,99 +3,93 @@ Gradio App for GaitLab - Clinical Gait Analysis
 Deployed on Hugging Face Spaces
 """
 import gradio as gr
-import torch
 import tempfile
 import os
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-from utils.video_utils import process_video
-from utils.clinical_utils import ClinicalEmbedder
-from models.load_model import load_student_model
-from models.class_mapping import class_mapping, clinical_descriptions
+from models.engine import get_engine
+from models.class_mapping import clinical_descriptions
+from app.config import MAX_BATCH_SIZE, GRADIO_CONCURRENCY, GRADIO_MAX_QUEUE
 
-# Configuration
-NUM_FRAMES = 8
-FRAME_SIZE = 224
-CHUNK_SIZE = 2
-DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
-MODEL_PATH = 'models/gait_predict_model_v_1.pth'
+# Shared with the FastAPI service: same model, preprocessing and batching.
+# The model is loaded lazily (in the background at launch) so the UI comes up
+# immediately instead of waiting on torch.load.
+engine = get_engine()
 
-print(f"Loading model on device: {DEVICE}")
 
-# Initialize model and embedder
-embedder = ClinicalEmbedder()
-model = load_student_model(num_classes=len(class_mapping))
-model.to(DEVICE)
-model.eval()
+@contextmanager
+def _video_path(video_file):
+    """Yield a filesystem path for a Gradio video value.
 
-print("✓ Model and embedder loaded successfully")
+    gr.Video passes a path to its own cached copy; raw bytes are written to a
+    temp file that is removed on every exit path.
+    """
+    if isinstance(video_file, (str, os.PathLike)):
+        yield str(video_file)
+        return
+    fd, video_path = tempfile.mkstemp(suffix='.mp4')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(video_file)
+        yield video_path
+    finally:
+        if os.path.exists(video_path):
+            os.unlink(video_path)
 
 
-def predict_gait(video_file, clinical_condition):
-    """
-    Predict gait condition from video and clinical description.
-    
-    Args:
-        video_file: Uploaded video file
-        clinical_condition: Clinical condition description
-    
-    Returns:
-        Prediction results as formatted text
-    """
+def format_prediction(result):
+    """Render an engine result dict as Markdown."""
+    pred_class = result["predicted_class"]
+    text = f"## 🎯 Prediction: **{pred_class}**\n\n"
+    text += f"### Description:\n{clinical_descriptions.get(pred_class, 'N/A')}\n\n"
+    text += "### Class Probabilities:\n\n"
+
+    # Sort probabilities
+    sorted_probs = sorted(result["probabilities"].items(), key=lambda x: x[1], reverse=True)
+
+    for class_name, prob in sorted_probs:
+        bar = "█" * int(prob * 50)
+        text += f"**{class_name}**: {prob:.2%} {bar}\n\n"
+
+    return text
+
+
+def _predict_one(video_file, clinical_condition):
+    """Run one queued request through the engine's shared predict path."""
     if video_file is None:
         return "❌ Please upload a video file"
-    
     if not clinical_condition or not clinical_condition.strip():
         return "❌ Please provide a clinical condition description"
-    
     try:
-        # Save uploaded file to temp location
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp:
-            tmp.write(video_file)
-            video_path = tmp.name
-        
-        # Process video
-        video_tensor = process_video(
-            video_path,
-            num_frames=NUM_FRAMES,
-            frame_size=FRAME_SIZE,
-            chunk_size=CHUNK_SIZE
-        ).to(DEVICE)
-        
-        # Get clinical embedding
-        clinical_embed = embedder.get_embedding(clinical_condition).to(DEVICE)
-        
-        # Run inference
-        with torch.no_grad():
-            logits = model(video_tensor, clinical_embed)
-            probs = torch.softmax(logits, dim=1)
-            pred_idx = torch.argmax(probs, dim=1).item()
-            pred_class = list(class_mapping.keys())[pred_idx]
-        
-        # Format results
-        result = f"## 🎯 Prediction: **{pred_class}**\n\n"
-        result += f"### Description:\n{clinical_descriptions.get(pred_class, 'N/A')}\n\n"
-        result += "### Class Probabilities:\n\n"
-        
-        # Sort probabilities
-        prob_dict = {k: float(probs[0, v]) for k, v in class_mapping.items()}
-        sorted_probs = sorted(prob_dict.items(), key=lambda x: x[1], reverse=True)
-        
-        for class_name, prob in sorted_probs:
-            bar = "█" * int(prob * 50)
-            result += f"**{class_name}**: {prob:.2%} {bar}\n\n"
-        
-        # Cleanup
-        os.unlink(video_path)
-        del video_tensor, clinical_embed, logits, probs
-        torch.cuda.empty_cache() if torch.cuda.is_available() else None
-        
-        return result
-    
+        with _video_path(video_file) as video_path:
+            return format_prediction(engine.predict(video_path, clinical_condition))
     except Exception as e:
         return f"❌ Error during prediction: {str(e)}"
 
 
+def predict_gait(video_files, clinical_conditions):
+    """
+    Predict gait conditions for a batch of queued Gradio requests.
+
+    Each request goes through ``engine.predict`` (admission, cascade,
+    profiler capture, counters) exactly as an API request does; they run
+    concurrently, so the engine's micro-batcher still groups their forward
+    passes into one batch.
+
+    Args:
+        video_files: Uploaded video files, one per queued request
+        clinical_conditions: Clinical condition descriptions, one per request
+
+    Returns:
+        One list of formatted Markdown results (Gradio batch convention)
+    """
+    if len(video_files) == 1:
+        return [[_predict_one(video_files[0], clinical_conditions[0])]]
+    with ThreadPoolExecutor(max_workers=len(video_files)) as pool:
+        return [list(pool.map(_predict_one, video_files, clinical_conditions))]
+
+
 # Create Gradio interface
 with gr.Blocks(title="GaitLab - Clinical Gait Analysis", theme=gr.themes.Soft()) as demo:
     gr.Markdown("""
@@ -144,7 +138,9 @@ with gr.Blocks(title="GaitLab - Clinical Gait Analysis", theme=gr.themes.Soft())
     predict_btn.click(
         fn=predict_gait,
         inputs=[video_input, clinical_input],
-        outputs=output
+        outputs=output,
+        batch=True,
+        max_batch_size=MAX_BATCH_SIZE
     )
     
     gr.Markdown("""
@@ -160,6 +156,11 @@ with gr.Blocks(title="GaitLab - Clinical Gait Analysis", theme=gr.themes.Soft())
     - Output: 9 gait condition classes with confidence scores
     """)
 
+# Bounded concurrency: queued clicks are grouped into batches instead of
+# each user waiting for a full forward pass of everyone ahead of them
+demo.queue(default_concurrency_limit=GRADIO_CONCURRENCY, max_size=GRADIO_MAX_QUEUE)
+
 # Launch
 if __name__ == "__main__":
+    engine.start_background_load()
     demo.launch()
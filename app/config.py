@@ -1,15 +1,24 @@
 import os
 from pathlib import Path
 
-# Import torch lazily and defensively: if torch isn't available or its import
-# raises an error during build-time checks, we don't want the whole module
-# import to fail and leave top-level names (like CHUNK_SIZE) undefined.
-try:
-    import torch
-    _TORCH_AVAILABLE = True
-except Exception:
-    torch = None
-    _TORCH_AVAILABLE = False
+from utils.tta import TTA_VIEWS
+
+
+def _detect_device(disable_gpu):
+    """CUDA if available, else CPU.
+
+    Importing torch just to probe CUDA costs seconds of startup, so it is
+    skipped entirely when the GPU is disabled. A failing torch import (e.g.
+    during build-time checks) falls back to the DEVICE env var instead of
+    leaving the module half-initialized.
+    """
+    if disable_gpu:
+        return os.getenv('DEVICE', 'cpu')
+    try:
+        import torch
+    except Exception:
+        return os.getenv('DEVICE', 'cpu')
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
 
 
 class Settings:
@@ -29,13 +38,37 @@ class Settings:
 
     # Model Configuration
     MODEL_PATH: str = os.getenv('MODEL_PATH', 'models/gait_predict_model_v_1.pth')
-    NUM_FRAMES: int = int(os.getenv('NUM_FRAMES', 4))  # Ultra-minimal: 4 frames
+    NUM_FRAMES: int = int(os.getenv('NUM_FRAMES', 16))  # Must match the classifier (ClinicalEnhancedStudent: 16)
     FRAME_SIZE: int = int(os.getenv('FRAME_SIZE', 160))  # Reduced from 224 to 160
-    # Determine device without crashing if torch isn't importable or fails.
-    if _TORCH_AVAILABLE:
-        DEVICE: str = 'cuda' if torch.cuda.is_available() else 'cpu'
-    else:
-        DEVICE: str = os.getenv('DEVICE', 'cpu')
+    # Motion Crop Configuration: crop every clip to one box around the moving subject before resizing
+    MOTION_CROP: bool = os.getenv('MOTION_CROP', 'false').lower() == 'true'
+    MOTION_CROP_MARGIN: float = float(os.getenv('MOTION_CROP_MARGIN', 0.15))  # Padding per side, fraction of box
+    # Test-Time Augmentation: /predict may request up to this many views per clip, run as one batch
+    # (capped at the number of views utils.tta defines)
+    TTA_MAX_VIEWS: int = min(int(os.getenv('TTA_MAX_VIEWS', 4)), len(TTA_VIEWS))
+    # Thread Configuration: 0 keeps torch's default (one intra-op thread per core)
+    TORCH_NUM_THREADS: int = int(os.getenv('TORCH_NUM_THREADS', 0))
+    TORCH_INTEROP_THREADS: int = int(os.getenv('TORCH_INTEROP_THREADS', 0))
+    EMBED_CACHE_SIZE: int = int(os.getenv('EMBED_CACHE_SIZE', 256))  # Clinical text embeddings kept (LRU)
+    # Precision/Layout Configuration (oneDNN on Xeon is fastest with bf16 + channels_last_3d)
+    INFERENCE_PRECISION: str = os.getenv('INFERENCE_PRECISION', 'fp32').lower()  # fp32 | bf16 (autocast)
+    MEMORY_FORMAT: str = os.getenv('MEMORY_FORMAT', 'contiguous').lower()  # contiguous | channels_last_3d
+    # torch.compile Configuration: compiled once during warm-up, artifacts cached on disk
+    COMPILE_MODEL: bool = os.getenv('COMPILE_MODEL', 'false').lower() == 'true'
+    COMPILE_CACHE_DIR: str = os.getenv('COMPILE_CACHE_DIR', 'cache/torch_compile')
+    WARMUP_ON_STARTUP: bool = os.getenv('WARMUP_ON_STARTUP', 'false').lower() == 'true'
+    # Batching Configuration: concurrent requests are grouped into one forward pass
+    MAX_BATCH_SIZE: int = int(os.getenv('MAX_BATCH_SIZE', 4))
+    BATCH_TIMEOUT_MS: int = int(os.getenv('BATCH_TIMEOUT_MS', 10))  # Max wait to fill a batch
+    # Cascade Configuration: cheap low-frame/low-resolution pass first, full
+    # fidelity only when the cheap pass is not confident enough
+    CASCADE_ENABLED: bool = os.getenv('CASCADE_ENABLED', 'false').lower() == 'true'
+    CASCADE_NUM_FRAMES: int = int(os.getenv('CASCADE_NUM_FRAMES', max(1, NUM_FRAMES // 2)))
+    CASCADE_FRAME_SIZE: int = int(os.getenv('CASCADE_FRAME_SIZE', 112))
+    CASCADE_MIN_CONFIDENCE: float = float(os.getenv('CASCADE_MIN_CONFIDENCE', 0.9))  # Top-class probability
+    CASCADE_MIN_MARGIN: float = float(os.getenv('CASCADE_MIN_MARGIN', 0.0))  # Top-1 minus top-2 probability
+    # Determine device without importing torch when the GPU is disabled
+    DEVICE: str = _detect_device(DISABLE_GPU)
 
     # CORS Configuration: accept comma separated values in .env
     CORS_ORIGINS = [s.strip() for s in os.getenv('CORS_ORIGINS', 'http://localhost:5173,http://localhost:3000').split(',') if s.strip()]
@@ -45,18 +78,65 @@ class Settings:
     # Storage Configuration
     TEMP_UPLOAD_DIR: str = os.getenv('TEMP_UPLOAD_DIR', '/tmp')
     MAX_UPLOAD_SIZE: int = int(os.getenv('MAX_UPLOAD_SIZE', 104857600))  # 100MB
+    STREAM_DECODE_WORKERS: int = int(os.getenv('STREAM_DECODE_WORKERS', 4))  # Concurrent /predict/stream decodes
+
+    # Memory Admission Control: probe uploads and admit them against a live memory budget
+    ADMISSION_CONTROL: bool = os.getenv('ADMISSION_CONTROL', 'true').lower() == 'true'
+    MEMORY_LIMIT_MB: int = int(os.getenv('MEMORY_LIMIT_MB', 0))  # 0 = cgroup limit, else physical RAM
+    ADMISSION_MEMORY_FRACTION: float = float(os.getenv('ADMISSION_MEMORY_FRACTION', 0.85))  # Share of the limit usable
+    ADMISSION_ACTIVATION_FACTOR: float = float(os.getenv('ADMISSION_ACTIVATION_FACTOR', 12))  # Forward activations / input size
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 30))  # Seconds to wait for memory
+    ADMISSION_MAX_QUEUED: int = int(os.getenv('ADMISSION_MAX_QUEUED', 16))  # Waiting requests before rejecting
+
+    # Async Job Queue Configuration: the defaults live under TEMP_UPLOAD_DIR, so point
+    # JOB_DB_PATH and JOB_UPLOAD_DIR at a persistent volume for jobs to survive restarts
+    JOB_DB_PATH: str = os.getenv('JOB_DB_PATH', os.path.join(TEMP_UPLOAD_DIR, 'gaitlab_jobs.sqlite3'))
+    JOB_UPLOAD_DIR: str = os.getenv('JOB_UPLOAD_DIR', os.path.join(TEMP_UPLOAD_DIR, 'gaitlab_jobs'))
+    JOB_WORKERS: int = int(os.getenv('JOB_WORKERS', 1))  # Background threads draining the queue
+    JOB_MAX_PENDING: int = int(os.getenv('JOB_MAX_PENDING', 1000))  # Reject new jobs beyond this backlog
+    JOB_MAX_ATTEMPTS: int = int(os.getenv('JOB_MAX_ATTEMPTS', 3))  # Retries after restarts mid-job
+    JOB_POLL_INTERVAL: float = float(os.getenv('JOB_POLL_INTERVAL', 1.0))  # Seconds between idle polls
+    JOB_RESULT_TTL: float = float(os.getenv('JOB_RESULT_TTL', 24 * 3600))  # Seconds finished jobs are kept; 0 = forever
+    CALLBACK_TIMEOUT: int = int(os.getenv('CALLBACK_TIMEOUT', 10))
+    # Callback hosts allowed even on private networks (comma-separated); all other hosts must be public
+    CALLBACK_ALLOWED_HOSTS = [h.strip().lower() for h in os.getenv('CALLBACK_ALLOWED_HOSTS', '').split(',') if h.strip()]
+
+    # Distributed Inference Configuration: with INFERENCE_BACKEND=queue the API only enqueues
+    # uploads and separate `python worker.py` processes (any number of nodes) run the model
+    INFERENCE_BACKEND: str = os.getenv('INFERENCE_BACKEND', 'local').lower()  # local | queue
+    BROKER_URL: str = os.getenv('BROKER_URL', '')  # redis://host:6379/0, sqlite:///path, or empty for JOB_DB_PATH
+    INFERENCE_WORKERS: int = int(os.getenv('INFERENCE_WORKERS', 1))  # Processes started by worker.py
+    WORKER_BATCH_SIZE: int = int(os.getenv('WORKER_BATCH_SIZE', MAX_BATCH_SIZE))  # Jobs claimed at once
+    WORKER_HEARTBEAT_INTERVAL: float = float(os.getenv('WORKER_HEARTBEAT_INTERVAL', 5))
+    WORKER_HEARTBEAT_TIMEOUT: float = float(os.getenv('WORKER_HEARTBEAT_TIMEOUT', 30))  # Then its jobs are requeued
+    QUEUE_RESULT_TIMEOUT: float = float(os.getenv('QUEUE_RESULT_TIMEOUT', TIMEOUT))  # /predict wait for a worker
+    QUEUE_POLL_INTERVAL: float = float(os.getenv('QUEUE_POLL_INTERVAL', 0.05))  # /predict result polling
+
+    # Admin / Profiling Configuration: admin endpoints are disabled unless ADMIN_TOKEN is set
+    ADMIN_TOKEN: str = os.getenv('ADMIN_TOKEN', '')
+    PROFILE_DIR: str = os.getenv('PROFILE_DIR', os.path.join(TEMP_UPLOAD_DIR, 'gaitlab_profiles'))
+    PROFILE_SAMPLE_INTERVAL_MS: float = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 5))  # Python stack sampling
+
+    # Gradio Queue Configuration
+    GRADIO_CONCURRENCY: int = int(os.getenv('GRADIO_CONCURRENCY', 2))  # Concurrent workers per event
+    GRADIO_MAX_QUEUE: int = int(os.getenv('GRADIO_MAX_QUEUE', 32))  # Waiting users before rejecting
 
 
 # Create global settings instance
 settings = Settings()
 
-# Ensure temp directory exists
+# Ensure temp and job directories exist
 os.makedirs(settings.TEMP_UPLOAD_DIR, exist_ok=True)
+os.makedirs(settings.JOB_UPLOAD_DIR, exist_ok=True)
 
 # Ensure model path is absolute
 if not os.path.isabs(settings.MODEL_PATH):
     settings.MODEL_PATH = str(Path(__file__).parent.parent / settings.MODEL_PATH)
 
+# Ensure compile cache path is absolute so restarts from any cwd reuse it
+if not os.path.isabs(settings.COMPILE_CACHE_DIR):
+    settings.COMPILE_CACHE_DIR = str(Path(__file__).parent.parent / settings.COMPILE_CACHE_DIR)
+
 # Backwards-compatible top-level names used by other modules
 MODEL_PATH = settings.MODEL_PATH
 DEVICE = settings.DEVICE
@@ -64,12 +144,59 @@ DISABLE_GPU = settings.DISABLE_GPU
 NUM_FRAMES = settings.NUM_FRAMES
 FRAME_SIZE = settings.FRAME_SIZE
 CHUNK_SIZE = settings.CHUNK_SIZE
+MOTION_CROP = settings.MOTION_CROP
+MOTION_CROP_MARGIN = settings.MOTION_CROP_MARGIN
+TTA_MAX_VIEWS = settings.TTA_MAX_VIEWS
+TORCH_NUM_THREADS = settings.TORCH_NUM_THREADS
+TORCH_INTEROP_THREADS = settings.TORCH_INTEROP_THREADS
+EMBED_CACHE_SIZE = settings.EMBED_CACHE_SIZE
+INFERENCE_PRECISION = settings.INFERENCE_PRECISION
+MEMORY_FORMAT = settings.MEMORY_FORMAT
+COMPILE_MODEL = settings.COMPILE_MODEL
+COMPILE_CACHE_DIR = settings.COMPILE_CACHE_DIR
+WARMUP_ON_STARTUP = settings.WARMUP_ON_STARTUP
+MAX_BATCH_SIZE = settings.MAX_BATCH_SIZE
+BATCH_TIMEOUT_MS = settings.BATCH_TIMEOUT_MS
+CASCADE_ENABLED = settings.CASCADE_ENABLED
+CASCADE_NUM_FRAMES = settings.CASCADE_NUM_FRAMES
+CASCADE_FRAME_SIZE = settings.CASCADE_FRAME_SIZE
+CASCADE_MIN_CONFIDENCE = settings.CASCADE_MIN_CONFIDENCE
+CASCADE_MIN_MARGIN = settings.CASCADE_MIN_MARGIN
 TIMEOUT = settings.TIMEOUT
 WORKERS = settings.WORKERS
 PORT = settings.PORT
 HOST = settings.HOST
 TEMP_UPLOAD_DIR = settings.TEMP_UPLOAD_DIR
 MAX_UPLOAD_SIZE = settings.MAX_UPLOAD_SIZE
+STREAM_DECODE_WORKERS = settings.STREAM_DECODE_WORKERS
+ADMISSION_CONTROL = settings.ADMISSION_CONTROL
+MEMORY_LIMIT_MB = settings.MEMORY_LIMIT_MB
+ADMISSION_MEMORY_FRACTION = settings.ADMISSION_MEMORY_FRACTION
+ADMISSION_ACTIVATION_FACTOR = settings.ADMISSION_ACTIVATION_FACTOR
+ADMISSION_QUEUE_TIMEOUT = settings.ADMISSION_QUEUE_TIMEOUT
+ADMISSION_MAX_QUEUED = settings.ADMISSION_MAX_QUEUED
+JOB_DB_PATH = settings.JOB_DB_PATH
+JOB_UPLOAD_DIR = settings.JOB_UPLOAD_DIR
+JOB_WORKERS = settings.JOB_WORKERS
+JOB_MAX_PENDING = settings.JOB_MAX_PENDING
+JOB_MAX_ATTEMPTS = settings.JOB_MAX_ATTEMPTS
+JOB_POLL_INTERVAL = settings.JOB_POLL_INTERVAL
+JOB_RESULT_TTL = settings.JOB_RESULT_TTL
+CALLBACK_TIMEOUT = settings.CALLBACK_TIMEOUT
+CALLBACK_ALLOWED_HOSTS = settings.CALLBACK_ALLOWED_HOSTS
+INFERENCE_BACKEND = settings.INFERENCE_BACKEND
+BROKER_URL = settings.BROKER_URL
+INFERENCE_WORKERS = settings.INFERENCE_WORKERS
+WORKER_BATCH_SIZE = settings.WORKER_BATCH_SIZE
+WORKER_HEARTBEAT_INTERVAL = settings.WORKER_HEARTBEAT_INTERVAL
+WORKER_HEARTBEAT_TIMEOUT = settings.WORKER_HEARTBEAT_TIMEOUT
+QUEUE_RESULT_TIMEOUT = settings.QUEUE_RESULT_TIMEOUT
+QUEUE_POLL_INTERVAL = settings.QUEUE_POLL_INTERVAL
+ADMIN_TOKEN = settings.ADMIN_TOKEN
+PROFILE_DIR = settings.PROFILE_DIR
+PROFILE_SAMPLE_INTERVAL_MS = settings.PROFILE_SAMPLE_INTERVAL_MS
+GRADIO_CONCURRENCY = settings.GRADIO_CONCURRENCY
+GRADIO_MAX_QUEUE = settings.GRADIO_MAX_QUEUE
 CORS_ORIGINS = settings.CORS_ORIGINS
 CORS_METHODS = settings.CORS_METHODS
 CORS_HEADERS = settings.CORS_HEADERS
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Command-line gait prediction.
+
+Runs the same InferenceEngine (model loading, preprocessing, embedding
+cache, memory admission) as the FastAPI service and the Gradio app, with
+the same defaults from app.config; flags override individual settings.
+
+Usage:
+    python cli.py walk.mp4 --clinical-condition "Mild knee osteoarthritis"
+    python cli.py a.mp4 b.mp4 -c "Early Parkinson's disease" --json
+    python cli.py walk.mp4 -c "Normal gait" --precision bf16 --cascade
+    python cli.py walk.mp4 -c "Normal gait" --tta-views 4
+"""
+import argparse
+import json
+import logging
+import sys
+
+from models.class_mapping import clinical_descriptions
+from models.engine import InferenceEngine
+from utils.admission import AdmissionError
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='+', help='Video file(s) to classify')
+    parser.add_argument('-c', '--clinical-condition', required=True, help='Clinical description for every video')
+    parser.add_argument('--model-path', help='Checkpoint to load instead of MODEL_PATH')
+    parser.add_argument('--num-frames', type=int)
+    parser.add_argument('--frame-size', type=int)
+    parser.add_argument('--precision', choices=['fp32', 'bf16'])
+    parser.add_argument('--memory-format', choices=['contiguous', 'channels_last_3d'])
+    parser.add_argument('--threads', type=int, dest='num_threads', help='torch intra-op threads')
+    parser.add_argument('--cascade', action='store_true', default=None, help='Enable the two-stage cascade')
+    parser.add_argument('--tta-views', type=int, default=1,
+                        help='Average this many test-time augmented views (flip, temporal shift, crop)')
+    parser.add_argument('--json', action='store_true', help='Print one JSON object per video')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Show engine logs')
+    return parser.parse_args()
+
+
+def format_text(video, result):
+    pred_class = result['predicted_class']
+    lines = [f"{video}: {pred_class}", f"  {clinical_descriptions.get(pred_class, 'N/A')}"]
+    for class_name, prob in sorted(result['probabilities'].items(), key=lambda x: x[1], reverse=True):
+        lines.append(f"  {class_name:<22} {prob:7.2%}")
+    return '\n'.join(lines)
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    overrides = {
+        key: getattr(args, key)
+        for key in ('model_path', 'num_frames', 'frame_size', 'precision', 'memory_format', 'num_threads', 'cascade')
+        if getattr(args, key) is not None
+    }
+    engine = InferenceEngine(**overrides).load()
+
+    failed = 0
+    for video in args.videos:
+        try:
+            if args.tta_views > 1:
+                result = engine.predict_tta(video, args.clinical_condition, args.tta_views)
+            else:
+                result = engine.predict(video, args.clinical_condition)
+        except (AdmissionError, OSError, RuntimeError) as e:
+            failed += 1
+            if args.json:
+                print(json.dumps({'video': video, 'error': str(e)}))
+            else:
+                print(f"{video}: error: {str(e)}", file=sys.stderr)
+            continue
+        print(json.dumps({'video': video, **result}) if args.json else format_text(video, result))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,13 +6,16 @@ import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.routes import router
-from app.config import CORS_ORIGINS, CORS_METHODS, CORS_HEADERS
+from api.jobs import router as jobs_router, start_job_workers, stop_job_workers
+from api.admin import router as admin_router
+from app.config import CORS_ORIGINS, CORS_METHODS, CORS_HEADERS, COMPILE_MODEL, WARMUP_ON_STARTUP, INFERENCE_BACKEND
+from models.engine import get_engine
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
- 1   title="GaitLab - Clinical Gait Analysis API",
+    title="GaitLab - Clinical Gait Analysis API",
     description="FastAPI server for video-based gait analysis using deep learning models",
     version="1.0.0",
     docs_url="/docs",
@@ -31,6 +34,27 @@ app.add_middleware(
 
 # Include API routes (health, ready, predict, conditions)
 app.include_router(router)
+# Asynchronous job API (submit, status)
+app.include_router(jobs_router)
+# Admin-guarded profiling endpoints (disabled unless ADMIN_TOKEN is set)
+app.include_router(admin_router)
+
+
+@app.on_event("startup")
+async def startup():
+    """Start background workers that drain the persistent job queue."""
+    start_job_workers()
+    # With INFERENCE_BACKEND=queue the model is loaded by worker.py processes instead
+    if INFERENCE_BACKEND == 'queue':
+        return
+    # Compile/warm up off the request path; /ready stays 503 until done
+    if WARMUP_ON_STARTUP or COMPILE_MODEL:
+        get_engine().start_background_load()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    stop_job_workers()
 
 # Note: Model initialization is deferred to first request (lazy loading)
 # to avoid Render startup timeouts. The _ensure_model_loaded() is called
@@ -0,0 +1,563 @@
+"""
+Shared inference engine.
+
+Owns the lazily-loaded student model and clinical embedder, torch thread
+settings and an embedding cache, and funnels forward passes from concurrent
+callers through a micro-batcher, so the FastAPI service, the Gradio app and
+the CLI run the same pipeline with the same defaults.
+
+torch, cv2 and decord take seconds to import, so they are imported inside
+the methods that need them (first ``load``/``preprocess``); importing this
+module, and therefore starting the API, stays cheap.
+"""
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+
+from utils.admission import MB, MemoryAdmission, estimate_peak_bytes, probe_video
+from utils.profiling import ProfilerController, is_capturing, stage
+from models.class_mapping import class_mapping
+from app.config import (
+    MODEL_PATH, DEVICE, NUM_FRAMES, FRAME_SIZE, CHUNK_SIZE, MAX_BATCH_SIZE, BATCH_TIMEOUT_MS,
+    INFERENCE_PRECISION, MEMORY_FORMAT, COMPILE_MODEL, PROFILE_DIR, PROFILE_SAMPLE_INTERVAL_MS,
+    CASCADE_ENABLED, CASCADE_NUM_FRAMES, CASCADE_FRAME_SIZE, CASCADE_MIN_CONFIDENCE, CASCADE_MIN_MARGIN,
+    ADMISSION_CONTROL, MEMORY_LIMIT_MB, ADMISSION_MEMORY_FRACTION, ADMISSION_ACTIVATION_FACTOR,
+    ADMISSION_QUEUE_TIMEOUT, ADMISSION_MAX_QUEUED, TORCH_NUM_THREADS, TORCH_INTEROP_THREADS, EMBED_CACHE_SIZE,
+    MOTION_CROP, MOTION_CROP_MARGIN, TTA_MAX_VIEWS,
+)
+
+logger = logging.getLogger(__name__)
+
+# On-demand capture of live requests, armed through the admin API
+profiler = ProfilerController(PROFILE_DIR, sample_interval=PROFILE_SAMPLE_INTERVAL_MS / 1000.0)
+
+
+class InferenceEngine:
+    """Load-once model wrapper with request micro-batching.
+
+    ``infer`` may be called from many threads at once: requests arriving
+    within ``batch_timeout_ms`` of each other are stacked (up to
+    ``max_batch_size``) and run through the model in a single forward pass.
+
+    With ``cascade`` enabled, ``predict`` first scores a cheap clip (fewer
+    decoded frames at a lower resolution) and only decodes and runs the full
+    ``num_frames``/``frame_size`` clip when the cheap answer is not confident.
+
+    With ``admission`` enabled, ``predict`` first probes the container
+    (no decoding), estimates the clip's peak memory and holds a reservation
+    against a live memory budget for the whole request; see
+    ``utils.admission.MemoryAdmission``.
+    """
+
+    def __init__(self, num_frames=NUM_FRAMES, frame_size=FRAME_SIZE, chunk_size=CHUNK_SIZE,
+                 device=DEVICE, precision=INFERENCE_PRECISION, memory_format=MEMORY_FORMAT, compile=COMPILE_MODEL,
+                 max_batch_size=MAX_BATCH_SIZE, batch_timeout_ms=BATCH_TIMEOUT_MS,
+                 cascade=CASCADE_ENABLED, cascade_num_frames=CASCADE_NUM_FRAMES,
+                 cascade_frame_size=CASCADE_FRAME_SIZE, cascade_min_confidence=CASCADE_MIN_CONFIDENCE,
+                 cascade_min_margin=CASCADE_MIN_MARGIN, admission=ADMISSION_CONTROL, model_path=MODEL_PATH,
+                 num_threads=TORCH_NUM_THREADS, interop_threads=TORCH_INTEROP_THREADS,
+                 embed_cache_size=EMBED_CACHE_SIZE, motion_crop=MOTION_CROP, motion_crop_margin=MOTION_CROP_MARGIN,
+                 tta_max_views=TTA_MAX_VIEWS):
+        self.model_path = model_path
+        self.tta_max_views = tta_max_views
+        self.motion_crop = motion_crop
+        self.motion_crop_margin = motion_crop_margin
+        self.num_threads = num_threads
+        self.interop_threads = interop_threads
+        self.embed_cache_size = embed_cache_size
+        self.num_frames = num_frames
+        self.frame_size = frame_size
+        self.chunk_size = chunk_size
+        self.device = device
+        self.precision = precision
+        self.memory_format = memory_format
+        self.compile = compile
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_timeout = batch_timeout_ms / 1000.0
+        self.cascade = cascade
+        self.cascade_num_frames = min(cascade_num_frames, num_frames)
+        self.cascade_frame_size = cascade_frame_size
+        self.cascade_min_confidence = cascade_min_confidence
+        self.cascade_min_margin = cascade_min_margin
+        self.admission = MemoryAdmission(
+            limit_bytes=MEMORY_LIMIT_MB * MB, fraction=ADMISSION_MEMORY_FRACTION,
+            queue_timeout=ADMISSION_QUEUE_TIMEOUT, max_queued=ADMISSION_MAX_QUEUED,
+        ) if admission else None
+        self.model = None
+        self.embedder = None
+        self._embed_cache = OrderedDict()
+        self._embed_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._batcher = None
+        self._loader = None
+        self._model_version = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "batched_samples": 0,
+            "cascade_stage1_exits": 0,
+            "cascade_stage2_runs": 0,
+            "embed_cache_hits": 0,
+            "embed_cache_misses": 0,
+            "tta_requests": 0,
+        }
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    @property
+    def ready(self):
+        return self.model is not None
+
+    @property
+    def model_version(self):
+        """Short id of the loaded checkpoint plus the settings that change outputs."""
+        if self._model_version is None:
+            try:
+                st = os.stat(self.model_path)
+                checkpoint = f"{os.path.basename(self.model_path)}:{st.st_size}:{st.st_mtime_ns}"
+            except OSError:
+                checkpoint = "missing"
+            config = (f"{self.num_frames}:{self.frame_size}:{self.precision}:{self.cascade}:"
+                      f"{self.cascade_num_frames}:{self.cascade_frame_size}:{self.cascade_min_confidence}:"
+                      f"{self.cascade_min_margin}:{self.motion_crop}:{self.motion_crop_margin}")
+            self._model_version = hashlib.sha256(f"{checkpoint}|{config}".encode()).hexdigest()[:16]
+        return self._model_version
+
+    @property
+    def loading(self):
+        """True while a background load/warm-up started by ``start_background_load`` runs."""
+        return self._loader is not None and self._loader.is_alive()
+
+    def start_background_load(self):
+        """Load (and warm up) the model in a daemon thread so startup is not blocked."""
+        if self.ready or self.loading:
+            return
+        self._loader = threading.Thread(target=self._load_safely, name="model-loader", daemon=True)
+        self._loader.start()
+
+    def _load_safely(self):
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f"Background model load failed: {str(e)}", exc_info=True)
+
+    def load(self):
+        """Load embedder and model on first call; later calls are no-ops.
+
+        A compiled model is warmed up here, before ``ready`` turns true, so
+        compilation never lands on a user request.
+        """
+        if self.model is not None:
+            return self
+        with self._load_lock:
+            if self.model is None:
+                try:
+                    import torch  # noqa: F401
+                except ImportError:
+                    raise RuntimeError("PyTorch is required")
+                from utils.clinical_utils import ClinicalEmbedder
+                from utils.precision import PRECISIONS, resolve_memory_format
+                from models.load_model import load_student_model
+
+                # Reject bad settings before spending time on the embedder and checkpoint
+                if self.precision not in PRECISIONS:
+                    raise ValueError(f"Unknown precision {self.precision!r}, expected one of {PRECISIONS}")
+                resolve_memory_format(self.memory_format)
+                self._configure_threads()
+                logger.info("Initializing embedder...")
+                self.embedder = ClinicalEmbedder()
+                logger.info("Embedder initialized. Loading model...")
+                model = load_student_model(
+                    num_classes=len(class_mapping), memory_format=self.memory_format, compile=self.compile,
+                    model_path=self.model_path,
+                ).to(self.device)
+                # Clip length is baked into the classifier's input size
+                expected_frames = getattr(model, 'input_frames', None)
+                if expected_frames is not None and expected_frames != self.num_frames:
+                    raise RuntimeError(f"The model takes {expected_frames}-frame clips but num_frames is "
+                                       f"{self.num_frames}; set NUM_FRAMES={expected_frames}")
+                if self.compile:
+                    self.warmup(model)
+                self.model = model
+                self._model_version = None  # Recomputed against the checkpoint just loaded
+                self._batcher = threading.Thread(target=self._batch_loop, name="inference-batcher", daemon=True)
+                self._batcher.start()
+                logger.info(f"Inference engine ready on {self.device} ({self.precision}, {self.memory_format})")
+        return self
+
+    def _configure_threads(self):
+        """Apply torch intra-/inter-op thread counts (0 keeps torch's default)."""
+        import torch
+
+        if self.num_threads > 0:
+            torch.set_num_threads(self.num_threads)
+        if self.interop_threads > 0:
+            try:
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError as e:
+                # Only settable before the first parallel op in the process
+                logger.warning(f"Could not set inter-op threads: {str(e)}")
+        logger.info(f"torch threads: {torch.get_num_threads()} intra-op, {torch.get_num_interop_threads()} inter-op")
+
+    def warmup_shapes(self):
+        """Every (B, C, T, H, W) input shape this engine can send to the model.
+
+        Besides micro-batches of 1..``max_batch_size``, test-time
+        augmentation sends one full-size batch of 2..``tta_max_views`` views.
+        """
+        from utils.tta import TTA_VIEWS
+
+        batch_sizes = list(range(1, self.max_batch_size + 1))
+        tta_views = min(self.tta_max_views, len(TTA_VIEWS))
+        full_sizes = batch_sizes + [views for views in range(2, tta_views + 1) if views > self.max_batch_size]
+        shapes = [(batch_size, 3, self.num_frames, self.frame_size, self.frame_size) for batch_size in full_sizes]
+        if self.cascade:
+            shapes += [(batch_size, 3, self.num_frames, self.cascade_frame_size, self.cascade_frame_size)
+                       for batch_size in batch_sizes]
+        return shapes
+
+    def warmup(self, model=None):
+        """Run one dummy forward pass per served shape (triggers compilation when enabled)."""
+        import torch
+        from utils.precision import autocast_context, resolve_memory_format
+
+        # Never truth-test a module: torch.compile's wrapper raises on len()
+        model = self.model if model is None else model
+        shapes = self.warmup_shapes()
+        if self.compile:
+            # One compiled graph per static shape; keep them all resident
+            import torch._dynamo
+            torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, len(shapes))
+        start = time.perf_counter()
+        for shape in shapes:
+            video = torch.zeros(shape).contiguous(memory_format=resolve_memory_format(self.memory_format))
+            embed = torch.zeros(shape[0], self.embedder.embedding_dim)
+            with torch.no_grad(), autocast_context(self.precision, self.device):
+                model(video.to(self.device), embed.to(self.device))
+        logger.info(f"Warm-up of {len(shapes)} input shape(s) took {time.perf_counter() - start:.1f}s")
+
+    def _decode_and_normalize(self, video_path, num_frames, frame_size):
+        from utils.video_utils import decode_frames, frames_to_tensor
+
+        with stage("decode"):
+            frames = decode_frames(video_path, num_frames=num_frames, frame_size=frame_size,
+                                   chunk_size=self.chunk_size, motion_crop=self.motion_crop,
+                                   crop_margin=self.motion_crop_margin)
+        with stage("preprocess"):
+            return frames_to_tensor(frames, memory_format=self.memory_format)
+
+    def preprocess(self, video_path):
+        """Decode and normalise a video file into a (1, C, T, H, W) tensor."""
+        return self._decode_and_normalize(video_path, self.num_frames, self.frame_size)
+
+    def preprocess_fast(self, video_path):
+        """Cascade stage-1 clip: fewer decoded frames at a lower resolution.
+
+        The classifier head is sized for ``num_frames`` time steps, so the
+        decoded frames are repeated (nearest index) back up to that length;
+        the savings come from decoding fewer frames and from the smaller
+        spatial size through the Conv3d stack.
+        """
+        import torch
+
+        tensor = self._decode_and_normalize(video_path, self.cascade_num_frames, self.cascade_frame_size)
+        decoded = tensor.shape[2]
+        if decoded != self.num_frames:
+            index = torch.linspace(0, decoded - 1, self.num_frames).round().long()
+            tensor = tensor.index_select(2, index)
+        return tensor
+
+    def embed(self, clinical_text):
+        """Clinical text embedding of shape (1, D), served from an LRU cache.
+
+        Callers must not modify the returned tensor in place; it is shared
+        by every request with the same text.
+        """
+        self.load()
+        with self._embed_lock:
+            embedding = self._embed_cache.get(clinical_text)
+            if embedding is not None:
+                self._embed_cache.move_to_end(clinical_text)
+        if embedding is not None:
+            self._count("embed_cache_hits")
+            return embedding
+        self._count("embed_cache_misses")
+        with stage("embedding"):
+            embedding = self.embedder.get_embedding(clinical_text)
+        if self.embed_cache_size > 0:
+            with self._embed_lock:
+                self._embed_cache[clinical_text] = embedding
+                while len(self._embed_cache) > self.embed_cache_size:
+                    self._embed_cache.popitem(last=False)
+        return embedding
+
+    def _forward(self, video_batch, embed_batch):
+        import torch
+        from utils.precision import autocast_context, resolve_memory_format
+
+        # No-op when the batch already matches the weights' layout
+        video_batch = video_batch.to(self.device).contiguous(memory_format=resolve_memory_format(self.memory_format))
+        with stage("forward"), torch.no_grad(), autocast_context(self.precision, self.device):
+            logits = self.model(video_batch, embed_batch.to(self.device))
+        return torch.softmax(logits.float(), dim=1).cpu()
+
+    def infer(self, video_tensor, clinical_embed):
+        """Queue one sample for the micro-batcher and wait for its (1, K) probabilities."""
+        self.load()
+        if is_capturing():
+            # Run inline so the profiled thread records the forward pass itself
+            return self.infer_batch([video_tensor], [clinical_embed])
+        future = Future()
+        self._requests.put((video_tensor, clinical_embed, future))
+        return future.result()
+
+    def infer_batch(self, video_tensors, clinical_embeds):
+        """Run an already-assembled batch in one forward pass, returning (N, K) probabilities.
+
+        Accepts lists of (1, ...) tensors or pre-stacked (N, ...) tensors.
+        """
+        import torch
+
+        self.load()
+        if isinstance(video_tensors, (list, tuple)):
+            video_tensors = torch.cat(video_tensors)
+        if isinstance(clinical_embeds, (list, tuple)):
+            clinical_embeds = torch.cat(clinical_embeds)
+        self._count("batches")
+        self._count("batched_samples", video_tensors.shape[0])
+        return self._forward(video_tensors, clinical_embeds)
+
+    def _collect_batch(self):
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.batch_timeout
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._collect_batch()
+            # Only tensors of identical shape can be stacked together
+            groups = {}
+            for item in batch:
+                groups.setdefault(tuple(item[0].shape[1:]), []).append(item)
+            for items in groups.values():
+                try:
+                    probs = self.infer_batch([v for v, _, _ in items], [e for _, e, _ in items])
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                for i, (_, _, future) in enumerate(items):
+                    future.set_result(probs[i:i + 1])
+            if len(batch) > 1:
+                logger.info(f"Ran batched forward pass for {len(batch)} requests")
+
+    @staticmethod
+    def format_result(probs):
+        """Turn a (1, K) probability tensor into the API response dict."""
+        import torch
+
+        pred_idx = int(torch.argmax(probs, dim=1).item())
+        pred_class = list(class_mapping.keys())[pred_idx]
+        return {
+            "predicted_class": pred_class,
+            "probabilities": {
+                k: float(probs[0, v]) for k, v in class_mapping.items()
+            }
+        }
+
+    def is_confident(self, probs):
+        """Whether a (1, K) probability row clears the cascade exit thresholds."""
+        import torch
+
+        top2 = torch.topk(probs[0], k=min(2, probs.shape[1])).values
+        confidence = float(top2[0])
+        margin = confidence - float(top2[1]) if top2.numel() > 1 else confidence
+        return confidence >= self.cascade_min_confidence and margin >= self.cascade_min_margin
+
+    def predict_cascade(self, video_path, clinical_text):
+        """Two-stage prediction: return the cheap answer when it is confident."""
+        clinical_embed = self.embed(clinical_text)
+        logger.info("Running cascade stage 1 (low resolution)...")
+        probs = self.infer(self.preprocess_fast(video_path), clinical_embed)
+        if self.is_confident(probs):
+            self._count("cascade_stage1_exits")
+            result = self.format_result(probs)
+            result["cascade_stage"] = "fast"
+        else:
+            self._count("cascade_stage2_runs")
+            logger.info("Stage 1 not confident, escalating to full fidelity...")
+            result = self.format_result(self.infer(self.preprocess(video_path), clinical_embed))
+            result["cascade_stage"] = "full"
+        logger.info(f"Prediction: {result['predicted_class']} (cascade stage: {result['cascade_stage']})")
+        return result
+
+    def predict(self, video_path, clinical_text):
+        """Full preprocess -> embed -> forward -> softmax pipeline for one video."""
+        self.load()
+        self._count("requests")
+        with self.admit(video_path):
+            if profiler.should_profile():
+                with profiler.capture("predict"):
+                    return self._predict(video_path, clinical_text)
+            return self._predict(video_path, clinical_text)
+
+    def predict_tta(self, video_path, clinical_text, views):
+        """Prediction averaged over ``views`` test-time augmented copies of the clip.
+
+        The clip is decoded once; its views (see ``utils.tta.TTA_VIEWS``) are
+        stacked and run in a single forward pass, bypassing the
+        micro-batcher since they already form a batch, and their softmax
+        outputs are averaged. Always uses the full clip (no cascade).
+        ``views`` beyond the number of defined views are ignored.
+        """
+        from utils.tta import TTA_VIEWS
+
+        # Capped before admission, so the reservation matches the batch that runs
+        views = min(views, len(TTA_VIEWS))
+        self.load()
+        self._count("requests")
+        self._count("tta_requests")
+        with self.admit(video_path, views=views):
+            if profiler.should_profile():
+                with profiler.capture("predict_tta"):
+                    return self._predict_tta(video_path, clinical_text, views)
+            return self._predict_tta(video_path, clinical_text, views)
+
+    def _predict_tta(self, video_path, clinical_text, views):
+        from utils.tta import build_views
+
+        video_tensor = self.preprocess(video_path)
+        with stage("tta"):
+            batch, names = build_views(video_tensor, views)
+        # A real copy, not expand(): a stride-0 input would miss the compiled warm-up graphs
+        clinical_embed = self.embed(clinical_text).repeat(batch.shape[0], 1)
+        probs = self.infer_batch(batch, clinical_embed).mean(dim=0, keepdim=True)
+        result = self.format_result(probs)
+        result["tta_views"] = ",".join(names)
+        return result
+
+    @contextmanager
+    def admit(self, video_path, views=1):
+        """Hold a memory reservation sized for ``video_path`` while the block runs.
+
+        ``views`` is the number of copies of the clip sent through the
+        forward pass together (test-time augmentation). Raises
+        ``utils.admission.AdmissionError`` subclasses for unreadable videos,
+        clips larger than the budget, or a queue timeout. Yields the
+        container probe (None when admission control is off).
+        """
+        if self.admission is None:
+            yield None
+            return
+        probe = probe_video(video_path)
+        with self._reserve(probe, views=views):
+            yield probe
+
+    def _reserve(self, probe, views=1):
+        # The cascade's cheap clip is smaller than the full one, which bounds the request
+        nbytes = estimate_peak_bytes(probe, self.num_frames, self.frame_size, self.chunk_size,
+                                     ADMISSION_ACTIVATION_FACTOR, motion_crop=self.motion_crop, views=views)
+        logger.info(f"Probed {probe['width']}x{probe['height']} {probe['codec']} video, "
+                    f"{probe['frames']} frames; reserving ~{nbytes // MB} MB")
+        return self.admission.reserve(nbytes)
+
+    def predict_stream(self, source, clinical_text):
+        """Predict from a ``utils.stream_decode.ByteStream`` while it is still being fed.
+
+        Headers are demuxed as soon as they arrive, admission is decided
+        from them, and sampled frames are decoded as their packets arrive,
+        so the clip is nearly ready when the upload completes. Always runs
+        the full clip (no cascade). Raises ``StreamingUnsupported`` when the
+        container needs seeking, including when its headers cannot be
+        probed from a pipe (MP4 with the index at the end); callers then
+        fall back to ``predict`` on the complete file. The source is
+        discarded on every exit path, so a producer waiting in
+        ``wait_for_room`` is always released.
+        """
+        from utils.admission import InvalidVideo, probe_container
+        from utils.stream_decode import StreamingUnsupported, open_stream
+
+        try:
+            self.load()
+            with open_stream(source) as container:
+                try:
+                    probe = probe_container(container)
+                except InvalidVideo as e:
+                    # Incomplete headers on a pipe; the complete file may still be fine
+                    raise StreamingUnsupported(f"Cannot probe stream: {str(e)}")
+                self._count("requests")
+                with self._reserve(probe) if self.admission is not None else nullcontext():
+                    if profiler.should_profile():
+                        with profiler.capture("predict_stream"):
+                            return self._predict_stream(container, probe, source, clinical_text)
+                    return self._predict_stream(container, probe, source, clinical_text)
+        finally:
+            source.discard()
+
+    def _predict_stream(self, container, probe, source, clinical_text):
+        from utils.stream_decode import sample_stream_frames
+        from utils.video_utils import frames_to_tensor
+
+        with stage("decode"):
+            frames = sample_stream_frames(container, self.num_frames, self.frame_size,
+                                          total_frames=probe['frames'], motion_crop=self.motion_crop,
+                                          crop_margin=self.motion_crop_margin)
+        source.discard()
+        with stage("preprocess"):
+            video_tensor = frames_to_tensor(frames, memory_format=self.memory_format)
+        return self.format_result(self.infer(video_tensor, self.embed(clinical_text)))
+
+    def _predict(self, video_path, clinical_text):
+        if self.cascade:
+            return self.predict_cascade(video_path, clinical_text)
+        logger.info("Processing video...")
+        video_tensor = self.preprocess(video_path)
+        logger.info(f"Video tensor shape: {video_tensor.shape}")
+        clinical_embed = self.embed(clinical_text)
+        logger.info("Running inference...")
+        result = self.format_result(self.infer(video_tensor, clinical_embed))
+        logger.info(f"Prediction: {result['predicted_class']}")
+        return result
+
+    def metrics(self):
+        """Counters for the /metrics endpoint."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_batch_size"] = stats["batched_samples"] / stats["batches"] if stats["batches"] else 0.0
+        if self.cascade:
+            decided = stats["cascade_stage1_exits"] + stats["cascade_stage2_runs"]
+            stats["cascade_exit_rate"] = stats["cascade_stage1_exits"] / decided if decided else 0.0
+        if self.admission is not None:
+            stats["admission"] = self.admission.stats()
+        return stats
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Process-wide engine shared by every entry point."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = InferenceEngine()
+        return _engine
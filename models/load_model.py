@@ -1,4 +1,5 @@
 import logging
+import os
 
 # Defensive torch import
 try:
@@ -9,31 +10,74 @@ except ImportError:
     _TORCH_AVAILABLE = False
 
 from .student_model import ClinicalEnhancedStudent
-from app.config import MODEL_PATH, DEVICE, DISABLE_GPU
+from app.config import MODEL_PATH, DEVICE, DISABLE_GPU, MEMORY_FORMAT, COMPILE_MODEL, COMPILE_CACHE_DIR
+from utils.precision import resolve_memory_format
 
 logger = logging.getLogger(__name__)
 
-def load_student_model(num_classes):
-    """Load student model for inference only (CPU, no gradients)."""
+
+def compile_model(model, cache_dir=COMPILE_CACHE_DIR):
+    """Wrap ``model`` in ``torch.compile`` (inductor) with an on-disk artifact cache.
+
+    Compilation is lazy: it happens on the first forward pass for each input
+    shape, so callers should run a warm-up pass before serving traffic. With
+    the FX graph cache pointed at ``cache_dir``, restarts reload compiled
+    kernels instead of recompiling.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ['TORCHINDUCTOR_CACHE_DIR'] = cache_dir
+    os.environ['TORCHINDUCTOR_FX_GRAPH_CACHE'] = '1'
+    import torch._inductor.config as inductor_config
+    inductor_config.fx_graph_cache = True
+    # Static shapes: we serve a fixed (B, 3, NUM_FRAMES, FRAME_SIZE, FRAME_SIZE) set
+    return torch.compile(model, backend='inductor', dynamic=False)
+
+
+def load_checkpoint_state(model_path=MODEL_PATH):
+    """Read a checkpoint's state dict onto the CPU.
+
+    Accepts a bare state dict or one wrapped under ``state_dict`` (training
+    checkpoints), and strips the ``module.`` prefix DataParallel adds.
+    """
+    state = torch.load(model_path, map_location='cpu', weights_only=False)
+    if isinstance(state, dict) and 'state_dict' in state:
+        state = state['state_dict']
+    if isinstance(state, dict):
+        state = {(k[len('module.'):] if k.startswith('module.') else k): v for k, v in state.items()}
+    return state
+
+
+def load_student_model(num_classes, memory_format=MEMORY_FORMAT, compile=COMPILE_MODEL,
+                       model_path=MODEL_PATH, model_class=ClinicalEnhancedStudent):
+    """Load student model for inference only (CPU, no gradients).
+
+    ``memory_format`` ('contiguous' or 'channels_last_3d') sets the layout of
+    the Conv3d weights; inputs should be produced in the same layout (see
+    ``process_video``) so oneDNN does not insert conversion copies. Reduced
+    precision is applied at forward time with ``utils.precision.autocast_context``.
+    ``compile`` returns the model wrapped by ``compile_model``.
+    """
     if not _TORCH_AVAILABLE:
         raise RuntimeError("PyTorch is required")
     
     device = 'cpu'  # Always CPU for low memory
     
     try:
-        model = ClinicalEnhancedStudent(num_classes=num_classes)
+        model = model_class(num_classes=num_classes)
         
         # Load weights
-        state_dict = torch.load(MODEL_PATH, map_location='cpu', weights_only=False)
-        model.load_state_dict(state_dict)
-        model.to(device)
+        model.load_state_dict(load_checkpoint_state(model_path))
+        model.to(device, memory_format=resolve_memory_format(memory_format))
         model.eval()
         
         # Disable gradients entirely for inference
         for param in model.parameters():
             param.requires_grad = False
         
-        logger.info(f"Model loaded on {device} (inference mode)")
+        if compile:
+            model = compile_model(model)
+
+        logger.info(f"Model loaded on {device} (inference mode, {memory_format}, compiled={compile})")
         return model
     except Exception as e:
         logger.error(f"Failed to load model: {e}", exc_info=True)
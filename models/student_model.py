@@ -10,6 +10,9 @@ except ImportError:
     F = None
 
 class ClinicalEnhancedStudent(nn.Module):
+    # The classifier is sized for clips of exactly this many frames
+    input_frames = 16
+
     def __init__(self, num_classes=9, clinical_dim=768):
         if not _TORCH_AVAILABLE:
             raise RuntimeError("PyTorch is required to use ClinicalEnhancedStudent")
@@ -28,7 +31,7 @@ class ClinicalEnhancedStudent(nn.Module):
 
         # Dummy forward to calculate feature size
         with torch.no_grad():
-            dummy = torch.randn(1, 3, 16, 224, 224)
+            dummy = torch.randn(1, 3, self.input_frames, 224, 224)
             visual_out = self.visual_encoder(dummy)
             visual_flat_size = visual_out.view(1, -1).shape[-1]
 
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Eager vs torch.compile latency at production input shapes.
+
+For every batch size from 1 to MAX_BATCH_SIZE at (NUM_FRAMES, FRAME_SIZE),
+reports the first-call time (compilation, or a cache load when
+COMPILE_CACHE_DIR is warm) and steady-state latency for the eager and the
+compiled model. Run it twice to see the effect of the persistent cache.
+
+Usage:
+    python scripts/benchmark_compile.py [--iters 20]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch  # noqa: E402
+
+from app.config import (  # noqa: E402
+    NUM_FRAMES, FRAME_SIZE, MAX_BATCH_SIZE, MEMORY_FORMAT, INFERENCE_PRECISION, COMPILE_CACHE_DIR,
+)
+from models.class_mapping import class_mapping  # noqa: E402
+from models.load_model import load_student_model  # noqa: E402
+from utils.clinical_utils import ClinicalEmbedder  # noqa: E402
+from utils.precision import autocast_context, resolve_memory_format  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--iters', type=int, default=20)
+    return parser.parse_args()
+
+
+def run(model, video, embed):
+    with torch.no_grad(), autocast_context(INFERENCE_PRECISION):
+        return model(video, embed)
+
+
+def measure(model, video, embed, warmup, iters):
+    start = time.perf_counter()
+    run(model, video, embed)
+    first_ms = 1000 * (time.perf_counter() - start)
+    for _ in range(warmup):
+        run(model, video, embed)
+    timings = []
+    for _ in range(iters):
+        start = time.perf_counter()
+        run(model, video, embed)
+        timings.append(1000 * (time.perf_counter() - start))
+    return first_ms, statistics.mean(timings), sorted(timings)[int(0.95 * (len(timings) - 1))]
+
+
+def main():
+    args = parse_args()
+    num_classes = len(class_mapping)
+    eager = load_student_model(num_classes=num_classes, compile=False)
+    compiled = load_student_model(num_classes=num_classes, compile=True)
+    import torch._dynamo
+    torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, args.max_batch_size)
+    embedder = ClinicalEmbedder()
+
+    print(f"Shapes: (B, 3, {NUM_FRAMES}, {FRAME_SIZE}, {FRAME_SIZE}), {INFERENCE_PRECISION}, {MEMORY_FORMAT}, "
+          f"{torch.get_num_threads()} threads")
+    print(f"Compile cache: {COMPILE_CACHE_DIR}")
+    print()
+    print(f"{'batch':>5}  {'eager_ms':>9}  {'eager_p95':>9}  {'compile_first_ms':>16}  "
+          f"{'compiled_ms':>11}  {'compiled_p95':>12}  {'speedup':>7}")
+
+    for batch_size in range(1, args.max_batch_size + 1):
+        video = torch.randn(batch_size, 3, NUM_FRAMES, FRAME_SIZE, FRAME_SIZE)
+        video = video.contiguous(memory_format=resolve_memory_format(MEMORY_FORMAT))
+        embed = embedder.get_embedding('Gait assessment').repeat(batch_size, 1)
+        _, eager_ms, eager_p95 = measure(eager, video, embed, args.warmup, args.iters)
+        first_ms, compiled_ms, compiled_p95 = measure(compiled, video, embed, args.warmup, args.iters)
+        print(f"{batch_size:>5}  {eager_ms:>9.1f}  {eager_p95:>9.1f}  {first_ms:>16.0f}  "
+              f"{compiled_ms:>11.1f}  {compiled_p95:>12.1f}  {eager_ms / compiled_ms:>6.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Parity and latency report for precision/layout modes.
+
+Runs the student model in every combination of INFERENCE_PRECISION
+(fp32, bf16) and MEMORY_FORMAT (contiguous, channels_last_3d) on the same
+input and compares each against the fp32/contiguous baseline: maximum
+absolute probability difference, top-1 agreement and forward latency.
+
+Usage:
+    python scripts/benchmark_precision.py [--video clip.mp4] [--batch-size 1] [--iters 20]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch  # noqa: E402
+
+from app.config import NUM_FRAMES, FRAME_SIZE, CHUNK_SIZE  # noqa: E402
+from models.class_mapping import class_mapping  # noqa: E402
+from models.load_model import load_student_model  # noqa: E402
+from utils.clinical_utils import ClinicalEmbedder  # noqa: E402
+from utils.precision import PRECISIONS, MEMORY_FORMATS, autocast_context  # noqa: E402
+from utils.video_utils import decode_frames, frames_to_tensor  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='Video to use as input (random frames if omitted)')
+    parser.add_argument('--clinical-text', default='Gait assessment')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--iters', type=int, default=20)
+    return parser.parse_args()
+
+
+def time_forward(model, video, embed, precision, warmup, iters):
+    timings = []
+    with torch.no_grad():
+        for i in range(warmup + iters):
+            start = time.perf_counter()
+            with autocast_context(precision):
+                logits = model(video, embed)
+            probs = torch.softmax(logits.float(), dim=1)
+            if i >= warmup:
+                timings.append(1000 * (time.perf_counter() - start))
+    return probs, timings
+
+
+def main():
+    args = parse_args()
+    torch.manual_seed(0)
+
+    if args.video:
+        frames = decode_frames(args.video, num_frames=NUM_FRAMES, frame_size=FRAME_SIZE, chunk_size=CHUNK_SIZE)
+    else:
+        frames = torch.randint(0, 256, (NUM_FRAMES, FRAME_SIZE, FRAME_SIZE, 3), dtype=torch.uint8).numpy()
+    embed = ClinicalEmbedder().get_embedding(args.clinical_text).repeat(args.batch_size, 1)
+
+    print(f"Input: batch {args.batch_size}, {NUM_FRAMES} frames at {FRAME_SIZE}px, "
+          f"{torch.get_num_threads()} threads")
+    print()
+    print(f"{'precision':>9}  {'layout':>16}  {'mean_ms':>8}  {'p50_ms':>8}  {'p95_ms':>8}  "
+          f"{'speedup':>7}  {'max_abs_diff':>12}  {'top1_agree':>10}")
+
+    baseline_probs = baseline_ms = None
+    for memory_format in MEMORY_FORMATS:
+        model = load_student_model(num_classes=len(class_mapping), memory_format=memory_format)
+        # cat (unlike repeat) keeps the channels_last_3d strides of its inputs
+        video = torch.cat([frames_to_tensor(frames, memory_format=memory_format)] * args.batch_size)
+        for precision in PRECISIONS:
+            probs, timings = time_forward(model, video, embed, precision, args.warmup, args.iters)
+            mean_ms = statistics.mean(timings)
+            p95_ms = sorted(timings)[int(0.95 * (len(timings) - 1))]
+            if baseline_probs is None:
+                baseline_probs, baseline_ms = probs, mean_ms
+            max_diff = (probs - baseline_probs).abs().max().item()
+            agree = (probs.argmax(dim=1) == baseline_probs.argmax(dim=1)).float().mean().item()
+            print(f"{precision:>9}  {memory_format:>16}  {mean_ms:>8.1f}  {statistics.median(timings):>8.1f}  "
+                  f"{p95_ms:>8.1f}  {baseline_ms / mean_ms:>6.2f}x  {max_diff:>12.2e}  {agree:>10.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Calibrate the cascade exit threshold (CASCADE_MIN_CONFIDENCE).
+
+Runs both cascade stages on every clip in a manifest and, for a sweep of
+candidate thresholds, reports how many clips would exit after the cheap
+stage, how often those early answers agree with the full-fidelity answer,
+and the expected compute per clip relative to always running full fidelity.
+
+Usage:
+    python scripts/calibrate_cascade.py --manifest clips.csv [--target-agreement 0.99]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch  # noqa: E402
+
+from models.engine import InferenceEngine  # noqa: E402
+from models.class_mapping import class_mapping  # noqa: E402
+from utils.manifest import read_manifest  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--manifest', required=True, help='CSV or JSONL manifest of clips')
+    parser.add_argument('--target-agreement', type=float, default=0.99,
+                        help='Minimum agreement between early exits and full-fidelity answers')
+    parser.add_argument('--min-margin', type=float, default=0.0, help='CASCADE_MIN_MARGIN to hold fixed')
+    parser.add_argument('--default-clinical-text', default='Gait assessment',
+                        help='Clinical text for manifest rows that have none')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    entries = read_manifest(args.manifest)
+    engine = InferenceEngine(max_batch_size=1, cascade=True).load()
+
+    fast_probs, full_probs, labels = [], [], []
+    fast_time = full_time = 0.0
+    for entry in entries:
+        embed = engine.embed(entry['clinical_condition'] or args.default_clinical_text)
+        try:
+            start = time.perf_counter()
+            fast = engine.infer(engine.preprocess_fast(entry['video_path']), embed)
+            mid = time.perf_counter()
+            full = engine.infer(engine.preprocess(entry['video_path']), embed)
+            end = time.perf_counter()
+        except Exception as e:
+            print(f"Skipping {entry['video_path']}: {e}", file=sys.stderr)
+            continue
+        fast_time += mid - start
+        full_time += end - mid
+        fast_probs.append(fast)
+        full_probs.append(full)
+        labels.append(entry['label'])
+
+    if not fast_probs:
+        print("No clips could be processed", file=sys.stderr)
+        return 1
+
+    n = len(fast_probs)
+    fast_probs = torch.cat(fast_probs)
+    full_probs = torch.cat(full_probs)
+    top2 = torch.topk(fast_probs, k=2, dim=1).values
+    confidence = top2[:, 0]
+    margin = top2[:, 0] - top2[:, 1]
+    agrees = fast_probs.argmax(dim=1) == full_probs.argmax(dim=1)
+    cost_ratio = (fast_time / n) / (full_time / n) if full_time else 0.0
+
+    print(f"Clips: {n}")
+    print(f"Mean latency: stage 1 {1000 * fast_time / n:.1f} ms, full {1000 * full_time / n:.1f} ms")
+    if all(labels):
+        label_idx = torch.tensor([class_mapping[label] for label in labels])
+        print(f"Accuracy: stage 1 {(fast_probs.argmax(dim=1) == label_idx).float().mean():.3f}, "
+              f"full {(full_probs.argmax(dim=1) == label_idx).float().mean():.3f}")
+    print()
+    print(f"{'threshold':>9}  {'exit_rate':>9}  {'agreement':>9}  {'rel_cost':>8}")
+
+    recommended = None
+    for threshold in [round(0.50 + 0.05 * i, 2) for i in range(10)] + [0.97, 0.98, 0.99]:
+        exits = (confidence >= threshold) & (margin >= args.min_margin)
+        exit_rate = exits.float().mean().item()
+        agreement = agrees[exits].float().mean().item() if exits.any() else 1.0
+        # Every clip pays for stage 1; escalated clips also pay for full fidelity
+        rel_cost = cost_ratio + (1.0 - exit_rate)
+        print(f"{threshold:>9.2f}  {exit_rate:>9.3f}  {agreement:>9.3f}  {rel_cost:>8.3f}")
+        if recommended is None and agreement >= args.target_agreement:
+            recommended = threshold
+
+    print()
+    if recommended is None:
+        print(f"No threshold reaches {args.target_agreement:.3f} agreement; keep the cascade disabled")
+    else:
+        print(f"Recommended CASCADE_MIN_CONFIDENCE={recommended}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Startup import-time budget check.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter and
+fails when the module's cumulative import time exceeds the budget, or when
+any module that must stay lazy (torch, cv2, decord, numpy by default) is
+imported at startup. Meant for CI / docker builds so a stray top-level import
+does not silently put seconds back on cold starts.
+
+Usage:
+    python scripts/check_import_time.py [--module main] [--budget-ms 1500]
+    python scripts/check_import_time.py --forbid torch,cv2 --top 20 --out importtime.log
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_FORBIDDEN = 'torch,cv2,decord,numpy'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='main', help='Module to import (default: main)')
+    parser.add_argument('--budget-ms', type=float, default=1500.0,
+                        help='Maximum cumulative import time of --module in milliseconds')
+    parser.add_argument('--forbid', default=DEFAULT_FORBIDDEN,
+                        help='Comma separated top-level modules that must not be imported (empty to allow all)')
+    parser.add_argument('--top', type=int, default=15, help='Number of slowest imports to print')
+    parser.add_argument('--out', help='Write the raw -X importtime output to this file')
+    return parser.parse_args()
+
+
+def run_importtime(module):
+    """Raw ``-X importtime`` stderr from importing ``module`` in a fresh interpreter."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    # Matches production: no GPU probe, so config never reaches for torch
+    env.setdefault('DISABLE_GPU', 'true')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"Importing {module} failed with exit code {proc.returncode}")
+    return proc.stderr
+
+
+def parse_importtime(output):
+    """List of (module, self_us, cumulative_us) in import order."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    args = parse_args()
+    output = run_importtime(args.module)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+
+    rows = parse_importtime(output)
+    total_ms = next((cum for name, _, cum in rows if name == args.module), 0) / 1000.0
+    forbidden = {m.strip() for m in args.forbid.split(',') if m.strip()}
+    leaked = sorted({name.split('.')[0] for name, _, _ in rows} & forbidden)
+
+    print(f"import {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print("\nSlowest imports (cumulative):")
+    for name, _, cum in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"  {cum / 1000.0:9.1f} ms  {name}")
+
+    failed = False
+    if total_ms > args.budget_ms:
+        print(f"\nFAIL: import time {total_ms:.1f} ms exceeds budget of {args.budget_ms:.0f} ms")
+        failed = True
+    if leaked:
+        print(f"\nFAIL: modules that must be imported lazily were imported at startup: {', '.join(leaked)}")
+        failed = True
+    if not failed:
+        print("\nOK")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
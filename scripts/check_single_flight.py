@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Regression check for request coalescing under cancellation.
+
+Runs ``SingleFlight.do_async`` with several callers sharing one key and
+cancels some of them mid-flight (as happens when an HTTP client disconnects):
+the shared work must still finish once, and every caller left waiting must
+get its result. Meant for CI next to check_import_time.py.
+
+Usage:
+    python scripts/check_single_flight.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.single_flight import SingleFlight  # noqa: E402
+
+
+async def run_case(cancel):
+    """Start three callers on one key, cancel those at the indexes in ``cancel``."""
+    flight = SingleFlight()
+    release = asyncio.Event()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await release.wait()
+        return 'done'
+
+    callers = [asyncio.ensure_future(flight.do_async('key', work)) for _ in range(3)]
+    await asyncio.sleep(0)  # Let every caller join before cancelling
+    for i in cancel:
+        callers[i].cancel()
+    await asyncio.sleep(0)
+    release.set()
+    outcomes = await asyncio.gather(*callers, return_exceptions=True)
+
+    errors = []
+    if len(runs) != 1:
+        errors.append(f"work ran {len(runs)} times")
+    for i, outcome in enumerate(outcomes):
+        expected = asyncio.CancelledError if i in cancel else str
+        if not isinstance(outcome, expected):
+            errors.append(f"caller {i}: got {outcome!r}")
+    if flight.stats()['in_flight']:
+        errors.append("key still in flight after the work finished")
+    return errors
+
+
+def main():
+    cases = {
+        'follower cancelled': (1,),
+        'leader cancelled': (0,),
+        'leader and a follower cancelled': (0, 2),
+    }
+    failed = False
+    for name, cancel in cases.items():
+        errors = asyncio.run(run_case(cancel))
+        print(f"{name}: {'FAIL' if errors else 'ok'}")
+        for error in errors:
+            print(f"  {error}")
+        failed = failed or bool(errors)
+    if not failed:
+        print("\nOK")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Evaluate accuracy and throughput of a named inference configuration.
+
+Runs batched inference over a labeled manifest (or a prebuilt clip store)
+and reports, in one place, per-class precision/recall/F1, the confusion
+matrix, calibration (ECE, Brier, reliability bins), clips/sec and peak RSS,
+so every performance change comes with its accuracy cost.
+
+Usage:
+    python scripts/evaluate.py --manifest labeled.csv --config bf16 [--out report.json]
+    python scripts/evaluate.py --clip-store clip_store/ --config channels_last --batch-size 8
+    python scripts/evaluate.py --manifest labeled.csv --config default --set frame_size=112
+
+Labels must be class names from models/class_mapping.py.
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch  # noqa: E402
+
+from models.class_mapping import class_mapping  # noqa: E402
+from models.engine import InferenceEngine  # noqa: E402
+from utils.clip_store import ClipStore  # noqa: E402
+from utils.evaluation import classification_report, format_report  # noqa: E402
+from utils.manifest import read_manifest  # noqa: E402
+from utils.video_utils import frames_to_tensor  # noqa: E402
+
+# Named configurations: InferenceEngine keyword overrides on top of app settings
+CONFIGS = {
+    'default': {},
+    'low_res': {'frame_size': 112},
+    'bf16': {'precision': 'bf16'},
+    'channels_last': {'memory_format': 'channels_last_3d'},
+    'bf16_channels_last': {'precision': 'bf16', 'memory_format': 'channels_last_3d'},
+    'compiled': {'compile': True},
+    'cascade': {'cascade': True},
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--manifest', help='Labeled CSV or JSONL manifest')
+    source.add_argument('--clip-store', help='Clip store built by scripts/build_clip_store.py')
+    parser.add_argument('--config', default='default', choices=sorted(CONFIGS))
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra InferenceEngine override, e.g. frame_size=112 (repeatable)')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--bins', type=int, default=10, help='Calibration bins')
+    parser.add_argument('--default-clinical-text', default='Gait assessment',
+                        help='Clinical text for clips that have none')
+    parser.add_argument('--out', help='Write the full report as JSON')
+    return parser.parse_args()
+
+
+def parse_override(item):
+    key, _, value = item.partition('=')
+    if value.lower() in ('true', 'false'):
+        return key, value.lower() == 'true'
+    for cast in (int, float):
+        try:
+            return key, cast(value)
+        except ValueError:
+            pass
+    return key, value
+
+
+def check_labels(items, describe):
+    """Exit before loading the model if any item's label is missing or not a class name."""
+    missing = [describe(item) for item in items if not item.get('label')]
+    if missing:
+        raise SystemExit(f"{len(missing)} clips have no label, e.g. {missing[0]}")
+    unknown = sorted({item['label'] for item in items if item['label'] not in class_mapping})
+    if unknown:
+        raise SystemExit(f"Unknown labels {unknown}; expected one of {list(class_mapping)}")
+
+
+def evaluate_manifest(engine, entries, batch_size, default_text):
+    """Decode + infer every clip; returns (probs, labels, decode_s, inference_s, skipped).
+
+    Clips that fail to decode are reported and skipped rather than ending the run.
+    """
+    probs, labels = [], []
+    decode_s = inference_s = 0.0
+    videos, embeds, batch_labels = [], [], []
+    skipped = 0
+
+    def flush():
+        nonlocal inference_s
+        start = time.perf_counter()
+        probs.append(engine.infer_batch(videos, embeds))
+        inference_s += time.perf_counter() - start
+        labels.extend(batch_labels)
+        videos.clear()
+        embeds.clear()
+        batch_labels.clear()
+
+    for entry in entries:
+        text = entry['clinical_condition'] or default_text
+        label = class_mapping[entry['label']]
+        start = time.perf_counter()
+        try:
+            if engine.cascade:
+                # The cascade decides per clip, so it runs (and is timed) end to end
+                result = engine.predict(entry['video_path'], text)
+            else:
+                video = engine.preprocess(entry['video_path'])
+        except Exception as e:
+            skipped += 1
+            print(f"Skipping {entry['video_path']}: {e}", file=sys.stderr)
+            continue
+        if engine.cascade:
+            inference_s += time.perf_counter() - start
+            probs.append(torch.tensor([[result['probabilities'][k] for k in class_mapping]]))
+            labels.append(label)
+            continue
+        decode_s += time.perf_counter() - start
+        videos.append(video)
+        embeds.append(engine.embed(text))
+        batch_labels.append(label)
+        if len(videos) == batch_size:
+            flush()
+    if videos:
+        flush()
+    return (torch.cat(probs) if probs else None), labels, decode_s, inference_s, skipped
+
+
+def evaluate_clip_store(engine, store, batch_size, default_text):
+    """Infer straight from the mmap store; decode time is zero by construction."""
+    probs, labels = [], []
+    inference_s = 0.0
+    for entries, frames in store.iter_batches(batch_size):
+        start = time.perf_counter()
+        video = frames_to_tensor(frames, memory_format=engine.memory_format)
+        embeds = torch.cat([engine.embed(e.get('clinical_condition') or default_text) for e in entries])
+        probs.append(engine.infer_batch(video, embeds))
+        inference_s += time.perf_counter() - start
+        labels.extend(class_mapping[e['label']] for e in entries)
+    return torch.cat(probs), labels, 0.0, inference_s, 0
+
+
+def main():
+    args = parse_args()
+    overrides = dict(CONFIGS[args.config])
+    overrides.update(parse_override(item) for item in args.set)
+
+    store = entries = None
+    if args.clip_store:
+        store = ClipStore(args.clip_store)
+        if overrides.get('cascade'):
+            raise SystemExit("The cascade config needs --manifest: it decodes at two resolutions")
+        # Clips were preprocessed at fixed settings; the engine must match them
+        overrides['num_frames'] = store.params['num_frames']
+        overrides['frame_size'] = store.params['frame_size']
+        # Stores built before motion cropping existed hold full-frame clips
+        overrides['motion_crop'] = store.params.get('motion_crop', False)
+        check_labels(store.clips, lambda clip: clip['video_id'])
+    else:
+        entries = read_manifest(args.manifest)
+        check_labels(entries, lambda entry: entry['video_path'])
+    # Warm-up (when compiled) covers every batch size the evaluation runs
+    overrides.setdefault('max_batch_size', args.batch_size)
+
+    engine = InferenceEngine(**overrides).load()
+
+    start = time.perf_counter()
+    if store is not None:
+        probs, labels, decode_s, inference_s, skipped = evaluate_clip_store(
+            engine, store, args.batch_size, args.default_clinical_text)
+    else:
+        probs, labels, decode_s, inference_s, skipped = evaluate_manifest(
+            engine, entries, args.batch_size, args.default_clinical_text)
+    elapsed = time.perf_counter() - start
+    if not labels:
+        print("No clips could be processed", file=sys.stderr)
+        return 1
+
+    class_names = list(class_mapping)
+    report = {
+        'config': args.config,
+        'overrides': overrides,
+        'clips': len(labels),
+        'skipped': skipped,
+        **classification_report(probs.numpy(), labels, class_names, n_bins=args.bins),
+        'throughput': {
+            'clips_per_sec': len(labels) / elapsed if elapsed else 0.0,
+            'elapsed_s': elapsed,
+            'decode_s': decode_s,
+            'inference_s': inference_s,
+        },
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'engine': engine.metrics(),
+    }
+
+    print(format_report(report, class_names))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Re-score every clip in a clip store with the current checkpoint.
+
+Batches are read straight from the memory-mapped shards, normalized and run
+through the model; no video decoding happens, so a re-scoring run after a
+checkpoint change is bound by model compute. Writes one JSON line per clip.
+
+Usage:
+    python scripts/score_clip_store.py --store clip_store/ --out scores.jsonl [--batch-size 8]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch  # noqa: E402
+
+from models.engine import InferenceEngine  # noqa: E402
+from utils.clip_store import ClipStore  # noqa: E402
+from utils.video_utils import frames_to_tensor  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', required=True, help='Clip store directory')
+    parser.add_argument('--out', required=True, help='Output JSONL file')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--default-clinical-text', default='Gait assessment',
+                        help='Clinical text for clips stored without one')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = ClipStore(args.store)
+    engine = InferenceEngine(
+        num_frames=store.params['num_frames'],
+        frame_size=store.params['frame_size'],
+        motion_crop=store.params.get('motion_crop', False),
+        cascade=False,
+        max_batch_size=args.batch_size,  # So warm-up covers the batch shapes scored here
+    ).load()
+
+    start = time.perf_counter()
+    with open(args.out, 'w') as out:
+        for entries, frames in store.iter_batches(args.batch_size):
+            video = frames_to_tensor(frames, memory_format=engine.memory_format)
+            embeds = torch.cat([
+                engine.embed(e.get('clinical_condition') or args.default_clinical_text) for e in entries
+            ])
+            probs = engine.infer_batch(video, embeds)
+            for i, entry in enumerate(entries):
+                result = engine.format_result(probs[i:i + 1])
+                out.write(json.dumps({'video_id': entry['video_id'], 'label': entry.get('label'), **result}) + '\n')
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {len(store)} clips in {elapsed:.1f}s ({len(store) / elapsed:.1f} clips/s) -> {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+MB = 1 << 20
+# Frames FFmpeg keeps alive inside the decoder (references + frame threading), as YUV420
+DECODER_POOL_FRAMES = 16
+# cgroup v1 reports "no limit" as a huge page-aligned number
+_UNLIMITED = 1 << 60
+
+
+class AdmissionError(Exception):
+    """A request turned away before any frame was decoded."""
+
+
+class InvalidVideo(AdmissionError):
+    """The upload has no readable video stream."""
+
+
+class ClipTooLarge(AdmissionError):
+    """The clip needs more memory than the whole budget."""
+
+
+class AdmissionTimeout(AdmissionError):
+    """The clip did not fit in the live budget before the queue timeout."""
+
+
+def probe_container(container):
+    """Video stream metadata of an open PyAV container (headers only)."""
+    import av
+
+    if not container.streams.video:
+        raise InvalidVideo("No video stream found")
+    stream = container.streams.video[0]
+    fps = float(stream.average_rate or 0)
+    frames = stream.frames
+    if not frames and stream.duration and stream.time_base:
+        frames = int(stream.duration * stream.time_base * fps)
+    elif not frames and container.duration:
+        frames = int(container.duration / av.time_base * fps)
+    probe = {
+        'frames': int(frames),
+        'width': stream.codec_context.width,
+        'height': stream.codec_context.height,
+        'fps': fps,
+        'codec': stream.codec_context.name,
+    }
+    if probe['width'] <= 0 or probe['height'] <= 0:
+        raise InvalidVideo("Video stream has no frame size")
+    return probe
+
+
+def probe_video(path):
+    """Container metadata without decoding any frames.
+
+    Uses PyAV when installed, otherwise OpenCV. ``frames`` is 0 when the
+    container records neither a frame count nor a duration.
+
+    Returns:
+        dict: frames, width, height, fps, codec
+    """
+    try:
+        import av
+    except ImportError:
+        av = None
+
+    if av is not None:
+        try:
+            with av.open(path) as container:
+                return probe_container(container)
+        except av.error.FFmpegError as e:
+            # The FFmpeg message names the (temporary) file path, so it stays in the log
+            logger.info(f"Could not probe video: {str(e)}")
+            raise InvalidVideo("Could not read video")
+
+    import cv2
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise InvalidVideo("Could not read video")
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        probe = {
+            'frames': max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))),
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': float(cap.get(cv2.CAP_PROP_FPS)),
+            'codec': ''.join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip('\x00 '),
+        }
+    finally:
+        cap.release()
+
+    if probe['width'] <= 0 or probe['height'] <= 0:
+        raise InvalidVideo("Video stream has no frame size")
+    return probe
+
+
+def estimate_peak_bytes(probe, num_frames, frame_size, chunk_size, activation_factor, motion_crop=False, views=1):
+    """Peak memory of decoding, preprocessing and one forward pass for a clip.
+
+    Decoding holds the decoder's frame pool plus one chunk of full-resolution
+    RGB frames next to the resized uint8 output. Afterwards the uint8 clip,
+    its float32 normalized copy and the layout copy coexist with the model's
+    activations, which (no autograd) scale with the input by
+    ``activation_factor``. Motion cropping keeps every sampled frame at full
+    resolution until the crop box is known. Test-time augmentation runs
+    ``views`` copies of the clip through the forward pass together.
+    """
+    pixels = probe['width'] * probe['height']
+    clip = num_frames * frame_size * frame_size * 3
+    held = num_frames if motion_crop else chunk_size
+    decode = DECODER_POOL_FRAMES * pixels * 3 // 2 + held * pixels * 3 + clip
+    forward = clip + 2 * clip * 4 + views * (clip * 4 + int(clip * 4 * activation_factor))
+    return max(decode, forward)
+
+
+def memory_limit_bytes():
+    """Container (cgroup v2/v1) memory limit, else physical RAM."""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < _UNLIMITED:
+            return int(value)
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+def current_rss_bytes():
+    """Resident set size of this process."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, IndexError, ValueError):
+        # Peak rather than current RSS, which only errs on the safe side
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryAdmission:
+    """Admits work against a live memory budget.
+
+    A request fits when ``RSS + reserved + estimate <= budget``, where
+    ``reserved`` sums the estimates of admitted requests still in flight
+    (partly already in RSS, so the check errs conservative). A request that
+    does not fit waits up to ``queue_timeout`` for in-flight work to finish,
+    with at most ``max_queued`` waiters; one larger than the whole budget is
+    rejected immediately. With nothing in flight a request is always
+    admitted, so a high idle RSS cannot stall the service.
+    """
+
+    def __init__(self, limit_bytes=None, fraction=0.85, queue_timeout=30.0, max_queued=16):
+        self.limit_bytes = limit_bytes or memory_limit_bytes()
+        self.budget = int(self.limit_bytes * fraction)
+        self.queue_timeout = queue_timeout
+        self.max_queued = max_queued
+        self._cond = threading.Condition()
+        self._reserved = 0
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {'admitted': 0, 'queued': 0, 'rejected_too_large': 0, 'rejected_timeout': 0}
+
+    def _fits(self, nbytes):
+        return self._in_flight == 0 or current_rss_bytes() + self._reserved + nbytes <= self.budget
+
+    @contextmanager
+    def reserve(self, nbytes):
+        """Hold ``nbytes`` of the budget for the enclosed block, waiting if needed."""
+        with self._cond:
+            if nbytes > self.budget:
+                self._stats['rejected_too_large'] += 1
+                raise ClipTooLarge(
+                    f"Video needs ~{nbytes // MB} MB to process; the memory budget is {self.budget // MB} MB")
+            if not self._fits(nbytes):
+                if self._waiting >= self.max_queued:
+                    self._stats['rejected_timeout'] += 1
+                    raise AdmissionTimeout("Too many requests waiting for memory")
+                self._waiting += 1
+                self._stats['queued'] += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while not self._fits(nbytes):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats['rejected_timeout'] += 1
+                            raise AdmissionTimeout("Timed out waiting for memory")
+                        # RSS also drops without a release, so re-check periodically
+                        self._cond.wait(min(remaining, 0.1))
+                finally:
+                    self._waiting -= 1
+            self._reserved += nbytes
+            self._in_flight += 1
+            self._stats['admitted'] += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._reserved -= nbytes
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'reserved_mb': self._reserved / MB,
+                'rss_mb': current_rss_bytes() / MB,
+                'budget_mb': self.budget / MB,
+            }
@@ -0,0 +1,140 @@
+import json
+import os
+
+import numpy as np
+
+INDEX_FILE = 'index.json'
+STORE_VERSION = 1
+DEFAULT_SHARD_SIZE = 1 << 30  # 1 GiB
+
+
+def _shard_name(i):
+    return f"shard_{i:05d}.u8"
+
+
+class ClipStoreWriter:
+    """Append preprocessed uint8 clips to sharded flat files plus a JSON index.
+
+    Each clip is stored as raw (T, H, W, C) bytes; ``params`` records the
+    preprocessing settings (frames, size, ...) so readers can check they
+    match the model configuration. The index is written on ``close``.
+    """
+
+    def __init__(self, root, params, shard_size=DEFAULT_SHARD_SIZE):
+        self.root = root
+        self.params = dict(params)
+        self.shard_size = shard_size
+        self.shards = []
+        self.clips = []
+        self._file = None
+        self._offset = 0
+        os.makedirs(root, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _open_shard(self):
+        if self._file is not None:
+            self._file.close()
+        name = _shard_name(len(self.shards))
+        self.shards.append(name)
+        self._file = open(os.path.join(self.root, name), 'wb')
+        self._offset = 0
+
+    def add(self, video_id, frames, **metadata):
+        """Append one clip; extra keyword arguments are stored in its index entry."""
+        frames = np.ascontiguousarray(frames, dtype=np.uint8)
+        if self._file is None or (self._offset and self._offset + frames.nbytes > self.shard_size):
+            self._open_shard()
+        self._file.write(frames.tobytes())
+        self.clips.append({
+            'video_id': video_id,
+            'shard': len(self.shards) - 1,
+            'offset': self._offset,
+            'shape': list(frames.shape),
+            **metadata,
+        })
+        self._offset += frames.nbytes
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        index = {
+            'version': STORE_VERSION,
+            'params': self.params,
+            'shards': self.shards,
+            'clips': self.clips,
+        }
+        tmp_path = os.path.join(self.root, INDEX_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, os.path.join(self.root, INDEX_FILE))
+
+
+class ClipStore:
+    """Read-only view of a store written by ``ClipStoreWriter``.
+
+    Shards are memory-mapped, so clips are served straight from the page
+    cache: ``__getitem__`` returns a view, and ``iter_batches`` returns one
+    view per batch when the batch's clips are adjacent in a shard (the
+    normal case for a store written in one pass).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, INDEX_FILE)) as f:
+            index = json.load(f)
+        if index.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported clip store version {index.get('version')}")
+        self.params = index['params']
+        self.shards = index['shards']
+        self.clips = index['clips']
+        self._maps = {}
+
+    def __len__(self):
+        return len(self.clips)
+
+    def _shard(self, i):
+        if i not in self._maps:
+            # Copy-on-write mapping: writable for torch.from_numpy, never modifies the file
+            self._maps[i] = np.memmap(os.path.join(self.root, self.shards[i]), dtype=np.uint8, mode='c')
+        return self._maps[i]
+
+    def __getitem__(self, i):
+        """uint8 (T, H, W, C) view of clip ``i``."""
+        clip = self.clips[i]
+        size = int(np.prod(clip['shape']))
+        return self._shard(clip['shard'])[clip['offset']:clip['offset'] + size].reshape(clip['shape'])
+
+    def _is_contiguous_run(self, clips):
+        first = clips[0]
+        size = int(np.prod(first['shape']))
+        return all(
+            c['shard'] == first['shard'] and c['shape'] == first['shape']
+            and c['offset'] == first['offset'] + k * size
+            for k, c in enumerate(clips)
+        )
+
+    def get_batch(self, start, stop):
+        """uint8 (B, T, H, W, C) array for clips ``start:stop``.
+
+        A single mmap view when the clips are adjacent in one shard,
+        otherwise a stacked copy.
+        """
+        clips = self.clips[start:stop]
+        if self._is_contiguous_run(clips):
+            first = clips[0]
+            size = int(np.prod(first['shape']))
+            flat = self._shard(first['shard'])[first['offset']:first['offset'] + size * len(clips)]
+            return flat.reshape([len(clips)] + first['shape'])
+        return np.stack([self[i] for i in range(start, stop)])
+
+    def iter_batches(self, batch_size):
+        """Yield ``(index_entries, frames)`` with frames shaped (B, T, H, W, C)."""
+        for start in range(0, len(self.clips), batch_size):
+            stop = min(start + batch_size, len(self.clips))
+            yield self.clips[start:stop], self.get_batch(start, stop)
@@ -0,0 +1,104 @@
+import numpy as np
+
+
+def confusion_matrix(y_true, y_pred, num_classes):
+    """(num_classes, num_classes) counts; rows are true classes, columns predictions."""
+    cm = np.zeros((num_classes, num_classes), dtype=np.int64)
+    np.add.at(cm, (np.asarray(y_true), np.asarray(y_pred)), 1)
+    return cm
+
+
+def per_class_metrics(cm, class_names):
+    """Precision, recall, F1 and support for every class of a confusion matrix."""
+    tp = np.diag(cm).astype(np.float64)
+    predicted = cm.sum(axis=0)
+    support = cm.sum(axis=1)
+    precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+    recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+    denom = precision + recall
+    f1 = np.divide(2 * precision * recall, denom, out=np.zeros_like(tp), where=denom > 0)
+    return {
+        name: {
+            'precision': float(precision[i]),
+            'recall': float(recall[i]),
+            'f1': float(f1[i]),
+            'support': int(support[i]),
+        }
+        for i, name in enumerate(class_names)
+    }
+
+
+def calibration(probs, y_true, n_bins=10):
+    """Expected calibration error, Brier score and reliability bins.
+
+    Args:
+        probs: (N, K) predicted probabilities
+        y_true: (N,) true class indices
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    y_true = np.asarray(y_true)
+    confidence = probs.max(axis=1)
+    correct = (probs.argmax(axis=1) == y_true).astype(np.float64)
+    one_hot = np.zeros_like(probs)
+    one_hot[np.arange(len(y_true)), y_true] = 1.0
+
+    edges = np.linspace(0.0, 1.0, n_bins + 1)
+    # Right-closed bins so confidence 1.0 lands in the last bin
+    bin_ids = np.clip(np.digitize(confidence, edges[1:-1], right=True), 0, n_bins - 1)
+    bins, ece = [], 0.0
+    for b in range(n_bins):
+        mask = bin_ids == b
+        count = int(mask.sum())
+        if not count:
+            continue
+        avg_conf = float(confidence[mask].mean())
+        accuracy = float(correct[mask].mean())
+        ece += count / len(confidence) * abs(avg_conf - accuracy)
+        bins.append({
+            'range': [float(edges[b]), float(edges[b + 1])],
+            'count': count,
+            'confidence': avg_conf,
+            'accuracy': accuracy,
+        })
+    return {
+        'ece': float(ece),
+        'brier': float(((probs - one_hot) ** 2).sum(axis=1).mean()),
+        'bins': bins,
+    }
+
+
+def classification_report(probs, y_true, class_names, n_bins=10):
+    """Accuracy, macro F1, per-class metrics, confusion matrix and calibration."""
+    probs = np.asarray(probs)
+    y_pred = probs.argmax(axis=1)
+    cm = confusion_matrix(y_true, y_pred, len(class_names))
+    per_class = per_class_metrics(cm, class_names)
+    return {
+        'accuracy': float((y_pred == np.asarray(y_true)).mean()),
+        'macro_f1': float(np.mean([m['f1'] for m in per_class.values()])),
+        'per_class': per_class,
+        'confusion_matrix': cm.tolist(),
+        'calibration': calibration(probs, y_true, n_bins=n_bins),
+    }
+
+
+def format_report(report, class_names):
+    """Plain-text rendering of an evaluation report."""
+    lines = [
+        f"Config: {report['config']}  clips: {report['clips']}  skipped: {report.get('skipped', 0)}",
+        f"Accuracy: {report['accuracy']:.4f}  macro F1: {report['macro_f1']:.4f}  "
+        f"ECE: {report['calibration']['ece']:.4f}  Brier: {report['calibration']['brier']:.4f}",
+        f"Throughput: {report['throughput']['clips_per_sec']:.2f} clips/s "
+        f"(decode {report['throughput']['decode_s']:.1f}s, inference {report['throughput']['inference_s']:.1f}s)  "
+        f"peak RSS: {report['peak_rss_mb']:.0f} MB",
+        "",
+        f"{'class':<22} {'precision':>9} {'recall':>7} {'f1':>6} {'support':>7}",
+    ]
+    for name, m in report['per_class'].items():
+        lines.append(f"{name:<22} {m['precision']:>9.3f} {m['recall']:>7.3f} {m['f1']:>6.3f} {m['support']:>7d}")
+    lines += ["", "Confusion matrix (rows: true, columns: predicted)"]
+    width = max(len(str(v)) for row in report['confusion_matrix'] for v in row) + 1
+    lines.append(' ' * 22 + ''.join(f"{i:>{width}}" for i in range(len(class_names))))
+    for i, (name, row) in enumerate(zip(class_names, report['confusion_matrix'])):
+        lines.append(f"{i:>2} {name:<19}" + ''.join(f"{v:>{width}}" for v in row))
+    return '\n'.join(lines)
@@ -0,0 +1,272 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle states
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    video_path TEXT NOT NULL,
+    clinical_condition TEXT NOT NULL,
+    callback_url TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    tta_views INTEGER NOT NULL DEFAULT 1,
+    error_code INTEGER,
+    worker TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    info TEXT NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+# Workers silent for this many heartbeat timeouts are dropped from the registry
+WORKER_RETENTION = 10
+
+# Columns added after the first release, for databases created before them
+_ADDED_COLUMNS = {
+    'tta_views': 'INTEGER NOT NULL DEFAULT 1',
+    'error_code': 'INTEGER',
+    'worker': 'TEXT',
+}
+
+
+class JobQueue:
+    """Persistent FIFO job queue backed by a local SQLite database.
+
+    Every operation opens its own short-lived connection, so a single
+    instance can be shared by request handlers and worker threads, and
+    several processes can point at the same database file. Jobs left in the
+    ``running`` state by a crash are put back on the queue by
+    ``recover_running`` at startup, or, when separate inference workers
+    (``worker.py``) heartbeat into the ``workers`` table, by
+    ``requeue_orphaned`` once their worker stops reporting.
+    """
+
+    def __init__(self, db_path, max_attempts=3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            existing = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        if job.get('result'):
+            job['result'] = json.loads(job['result'])
+        return job
+
+    def enqueue(self, video_path, clinical_condition, callback_url=None, job_id=None, tta_views=1):
+        """Add a pending job and return its id."""
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, video_path, clinical_condition, callback_url, "
+                "created_at, updated_at, tta_views) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, PENDING, video_path, clinical_condition, callback_url, now, now, tta_views),
+            )
+        return job_id
+
+    def claim(self):
+        """Atomically move the oldest pending job to ``running`` and return it."""
+        jobs = self.claim_batch(1)
+        return jobs[0] if jobs else None
+
+    def claim_batch(self, n, worker_id=None):
+        """Atomically move up to ``n`` oldest pending jobs to ``running`` and return them."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT ?",
+                (PENDING, n),
+            ).fetchall()
+            now = time.time()
+            conn.executemany(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, updated_at = ? WHERE id = ?",
+                [(RUNNING, worker_id, now, row['id']) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        jobs = [self._to_dict(row) for row in rows]
+        for job in jobs:
+            job['status'] = RUNNING
+            job['attempts'] += 1
+            job['worker'] = worker_id
+        return jobs
+
+    def complete(self, job_id, result):
+        """Mark a job as succeeded and store its JSON-serialisable result."""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (SUCCEEDED, json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id, error, error_code=None):
+        """Mark a job as failed with an error message and optional HTTP status code."""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, error_code = ?, updated_at = ? WHERE id = ?",
+                (FAILED, str(error), error_code, time.time(), job_id),
+            )
+
+    def requeue(self, job_id):
+        """Put a running job back on the queue to be retried; True if it was running."""
+        with self._connection() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, updated_at = ? WHERE id = ? AND status = ?",
+                (PENDING, time.time(), job_id, RUNNING),
+            )
+            return cur.rowcount > 0
+
+    def get(self, job_id):
+        """Return a job as a dict, or None if the id is unknown."""
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def count(self, status=PENDING):
+        """Number of jobs currently in ``status``."""
+        with self._connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)
+            ).fetchone()[0]
+
+    def purge_finished(self, older_than):
+        """Delete succeeded and failed jobs last updated more than ``older_than`` seconds ago.
+
+        Returns the number of jobs deleted.
+        """
+        with self._connection() as conn:
+            cur = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (SUCCEEDED, FAILED, time.time() - older_than),
+            )
+            return cur.rowcount
+
+    def recover_running(self):
+        """Requeue jobs interrupted by a restart; fail those out of attempts.
+
+        Returns the number of jobs put back on the queue.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ? AND attempts >= ?",
+                (FAILED, "Exceeded maximum attempts", now, RUNNING, self.max_attempts),
+            )
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (PENDING, now, RUNNING),
+            )
+            recovered = cur.rowcount
+        if recovered:
+            logger.info(f"Requeued {recovered} interrupted job(s)")
+        return recovered
+
+    def requeue_orphaned(self, stale_after):
+        """Requeue running jobs whose worker has not heartbeated for ``stale_after`` seconds.
+
+        Jobs out of attempts are failed instead. Workers silent for
+        WORKER_RETENTION times that long are deregistered. Returns the
+        number requeued.
+        """
+        now = time.time()
+        orphaned = (
+            "status = ? AND worker IS NOT NULL AND worker NOT IN "
+            "(SELECT id FROM workers WHERE heartbeat_at >= ?)"
+        )
+        with self._connection() as conn:
+            conn.execute(
+                f"UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE {orphaned} AND attempts >= ?",
+                (FAILED, "Exceeded maximum attempts", now, RUNNING, now - stale_after, self.max_attempts),
+            )
+            cur = conn.execute(
+                f"UPDATE jobs SET status = ?, worker = NULL, updated_at = ? WHERE {orphaned}",
+                (PENDING, now, RUNNING, now - stale_after),
+            )
+            requeued = cur.rowcount
+            conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - stale_after * WORKER_RETENTION,))
+        if requeued:
+            logger.info(f"Requeued {requeued} job(s) from unresponsive workers")
+        return requeued
+
+    def heartbeat(self, worker_id, info):
+        """Record that ``worker_id`` is alive, with a JSON-serialisable status dict."""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO workers (id, info, heartbeat_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET info = excluded.info, heartbeat_at = excluded.heartbeat_at",
+                (worker_id, json.dumps(info), time.time()),
+            )
+
+    def remove_worker(self, worker_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def workers(self):
+        """Every registered worker's last status, with ``id`` and ``heartbeat_at``."""
+        with self._connection() as conn:
+            rows = conn.execute("SELECT * FROM workers ORDER BY id").fetchall()
+        return [{'id': row['id'], 'heartbeat_at': row['heartbeat_at'], **json.loads(row['info'])} for row in rows]
+
+
+def open_job_queue(broker_url, db_path, max_attempts=3):
+    """The queue ``broker_url`` points at: ``redis://``/``rediss://`` or ``sqlite:///path``.
+
+    An empty URL uses the SQLite database at ``db_path``.
+    """
+    if broker_url.startswith(('redis://', 'rediss://', 'unix://')):
+        from utils.redis_queue import RedisJobQueue
+        return RedisJobQueue(broker_url, max_attempts=max_attempts)
+    if broker_url.startswith('sqlite:///'):
+        db_path = broker_url[len('sqlite:///'):]
+    elif broker_url:
+        raise ValueError(f"Unsupported BROKER_URL: {broker_url}")
+    return JobQueue(db_path, max_attempts=max_attempts)
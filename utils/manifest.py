@@ -0,0 +1,37 @@
+import csv
+import json
+import os
+
+
+def read_manifest(path):
+    """Read a clip manifest for offline tools.
+
+    Accepts CSV with a header row or JSON Lines. Each entry needs a
+    ``video_path``; ``clinical_condition``, ``label`` and ``video_id`` are
+    optional. Relative video paths are resolved against the manifest's
+    directory.
+
+    Returns:
+        list[dict]: One dict per clip with all four keys present.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='') as f:
+        if path.endswith(('.jsonl', '.json')):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    entries = []
+    for i, row in enumerate(rows):
+        video_path = (row.get('video_path') or '').strip()
+        if not video_path:
+            raise ValueError(f"Manifest row {i + 1} has no video_path")
+        if not os.path.isabs(video_path):
+            video_path = os.path.join(base_dir, video_path)
+        entries.append({
+            'video_id': (row.get('video_id') or '').strip() or os.path.splitext(os.path.basename(video_path))[0],
+            'video_path': video_path,
+            'clinical_condition': (row.get('clinical_condition') or '').strip(),
+            'label': (row.get('label') or '').strip() or None,
+        })
+    return entries
@@ -0,0 +1,32 @@
+from contextlib import nullcontext
+
+try:
+    import torch
+    _TORCH_AVAILABLE = True
+except ImportError:
+    torch = None
+    _TORCH_AVAILABLE = False
+
+PRECISIONS = ('fp32', 'bf16')
+MEMORY_FORMATS = ('contiguous', 'channels_last_3d')
+
+
+def resolve_memory_format(name):
+    """Map a MEMORY_FORMAT setting to a ``torch.memory_format``."""
+    if name not in MEMORY_FORMATS:
+        raise ValueError(f"Unknown memory format {name!r}, expected one of {MEMORY_FORMATS}")
+    return torch.channels_last_3d if name == 'channels_last_3d' else torch.contiguous_format
+
+
+def autocast_context(precision, device='cpu'):
+    """Context manager for running a forward pass at ``precision``.
+
+    ``fp32`` is a no-op; ``bf16`` enables autocast so Conv3d/Linear run in
+    bfloat16 while numerically sensitive ops stay in float32.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    if precision == 'fp32':
+        return nullcontext()
+    device_type = 'cuda' if str(device).startswith('cuda') else 'cpu'
+    return torch.autocast(device_type=device_type, dtype=torch.bfloat16)
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Per-thread flag set while the current request is being captured
+_local = threading.local()
+
+
+def is_capturing():
+    """True when the calling thread is inside ``ProfilerController.capture``."""
+    return getattr(_local, 'capturing', False)
+
+
+def stage(name):
+    """Label a pipeline stage in the torch trace; a no-op unless capturing."""
+    if not getattr(_local, 'capturing', False):
+        return nullcontext()
+    import torch
+    return torch.profiler.record_function(name)
+
+
+class StackSampler:
+    """Wall-clock Python stack sampler for one thread, exported as speedscope JSON."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self._frames = []
+        self._frame_index = {}
+        self._samples = []
+        self._weights = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = self._end = 0.0
+
+    def _frame_id(self, code, lineno):
+        key = (code.co_name, code.co_filename, lineno)
+        if key not in self._frame_index:
+            self._frame_index[key] = len(self._frames)
+            self._frames.append({'name': code.co_name, 'file': code.co_filename, 'line': lineno})
+        return self._frame_index[key]
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            # speedscope wants root -> leaf
+            self._samples.append(stack[::-1])
+            self._weights.append(now - last)
+            last = now
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._end = time.perf_counter()
+
+    def export_speedscope(self, path, name):
+        profile = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'gaitlab',
+            'shared': {'frames': self._frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0.0,
+                'endValue': self._end - self._start,
+                'samples': self._samples,
+                'weights': self._weights,
+            }],
+        }
+        with open(path, 'w') as f:
+            json.dump(profile, f)
+
+
+class ProfilerController:
+    """Arms on-demand capture of live requests.
+
+    While disarmed, ``should_profile`` is a single attribute check. Once
+    armed for ``requests`` captures (optionally only a ``sample_rate``
+    fraction of requests), each chosen request runs under ``capture``, which
+    records a torch.profiler Chrome trace and a Python stack-sample
+    speedscope profile into ``output_dir``. Only one capture runs at a time.
+    """
+
+    def __init__(self, output_dir, sample_interval=0.005):
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self._armed = False
+        self._remaining = 0
+        self._sample_rate = 1.0
+        self._lock = threading.Lock()
+        self._capture_lock = threading.Lock()
+
+    def arm(self, requests=1, sample_rate=None):
+        with self._lock:
+            self._remaining = max(1, int(requests))
+            self._sample_rate = 1.0 if sample_rate is None else min(1.0, max(0.0, float(sample_rate)))
+            self._armed = True
+        logger.info(f"Profiler armed for {self._remaining} request(s) at sample rate {self._sample_rate}")
+
+    def disarm(self):
+        with self._lock:
+            self._armed = False
+            self._remaining = 0
+
+    def status(self):
+        with self._lock:
+            return {'armed': self._armed, 'remaining': self._remaining, 'sample_rate': self._sample_rate}
+
+    def should_profile(self):
+        """Claim one capture slot for the current request, if armed and sampled."""
+        if not self._armed:
+            return False
+        with self._lock:
+            if not self._armed or random.random() >= self._sample_rate:
+                return False
+            if not self._capture_lock.acquire(blocking=False):
+                # Another request is being captured; torch.profiler can't nest
+                return False
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._armed = False
+            return True
+
+    @contextmanager
+    def capture(self, name):
+        """Profile the enclosed block; must follow a True ``should_profile``."""
+        # The slot claimed by should_profile is given back on every path,
+        # including a failure while setting up the capture
+        try:
+            import torch
+
+            os.makedirs(self.output_dir, exist_ok=True)
+            # Several captures can finish within the same second
+            base = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}_{name}")
+            sampler = StackSampler(threading.get_ident(), self.sample_interval)
+            prof = torch.profiler.profile(
+                activities=[torch.profiler.ProfilerActivity.CPU],
+                record_shapes=True,
+                with_stack=False,
+            )
+            sampler.start()
+            _local.capturing = True
+            try:
+                with prof:
+                    yield
+            finally:
+                _local.capturing = False
+                sampler.stop()
+                try:
+                    prof.export_chrome_trace(base + '.trace.json')
+                    sampler.export_speedscope(base + '.speedscope.json', name)
+                    logger.info(f"Profile written to {base}.*")
+                except Exception as e:
+                    logger.error(f"Failed to write profile: {str(e)}", exc_info=True)
+        finally:
+            self._capture_lock.release()
+
+    def list_profiles(self):
+        if not os.path.isdir(self.output_dir):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.output_dir), reverse=True):
+            path = os.path.join(self.output_dir, name)
+            if name.endswith('.json') and os.path.isfile(path):
+                st = os.stat(path)
+                profiles.append({'name': name, 'size': st.st_size, 'created_at': st.st_mtime})
+        return profiles
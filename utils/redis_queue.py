@@ -0,0 +1,202 @@
+import json
+import logging
+import time
+import uuid
+
+from utils.job_queue import PENDING, RUNNING, SUCCEEDED, FAILED, WORKER_RETENTION
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are kept this long for GET /jobs/{id} and /predict waiters
+RESULT_TTL = 24 * 3600
+
+# Pops up to ARGV[1] pending ids and marks them running in one step, so a worker
+# dying mid-claim cannot drop a job that is neither pending nor running.
+# RPOP with a count needs Redis 6.2 or later.
+_CLAIM_SCRIPT = """
+local ids = redis.call('RPOP', KEYS[1], ARGV[1])
+if not ids then
+    return {}
+end
+for _, id in ipairs(ids) do
+    local key = ARGV[2] .. id
+    redis.call('HINCRBY', key, 'attempts', 1)
+    redis.call('HSET', key, 'status', ARGV[3], 'worker', ARGV[4], 'updated_at', ARGV[5])
+    redis.call('SADD', KEYS[2], id)
+end
+return ids
+"""
+
+_INT_FIELDS = ('attempts', 'tta_views', 'error_code')
+_FLOAT_FIELDS = ('created_at', 'updated_at')
+
+
+class RedisJobQueue:
+    """``utils.job_queue.JobQueue`` on a Redis (or compatible) server.
+
+    For inference workers spread over several nodes, which cannot share a
+    SQLite file. Each job is a hash; pending ids sit in a list (oldest at
+    the tail), running ids in a set, and worker heartbeats in one hash.
+    Needs the optional ``redis`` package and Redis 6.2 or later. Video paths
+    are passed through as-is, so JOB_UPLOAD_DIR must be on storage every
+    node can read.
+    """
+
+    def __init__(self, url, max_attempts=3, prefix='gaitlab'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("BROKER_URL is a Redis URL but the 'redis' package is not installed")
+        self.max_attempts = max_attempts
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._prefix = prefix
+        self._claim = self._redis.register_script(_CLAIM_SCRIPT)
+
+    def _key(self, *parts):
+        return ':'.join((self._prefix,) + parts)
+
+    @staticmethod
+    def _to_dict(fields):
+        if not fields:
+            return None
+        job = dict(fields)
+        for key in _INT_FIELDS:
+            if job.get(key) not in (None, ''):
+                job[key] = int(job[key])
+        for key in _FLOAT_FIELDS:
+            job[key] = float(job[key])
+        for key in ('callback_url', 'result', 'error', 'error_code', 'worker'):
+            job.setdefault(key, None)
+        if job['result'] is not None:
+            job['result'] = json.loads(job['result'])
+        return job
+
+    def enqueue(self, video_path, clinical_condition, callback_url=None, job_id=None, tta_views=1):
+        """Add a pending job and return its id."""
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        fields = {
+            'id': job_id, 'status': PENDING, 'video_path': video_path,
+            'clinical_condition': clinical_condition, 'attempts': 0,
+            'created_at': now, 'updated_at': now, 'tta_views': tta_views,
+        }
+        if callback_url:
+            fields['callback_url'] = callback_url
+        pipe = self._redis.pipeline()
+        pipe.hset(self._key('job', job_id), mapping=fields)
+        pipe.lpush(self._key('pending'), job_id)
+        pipe.execute()
+        return job_id
+
+    def claim(self):
+        """Move the oldest pending job to ``running`` and return it."""
+        jobs = self.claim_batch(1)
+        return jobs[0] if jobs else None
+
+    def claim_batch(self, n, worker_id=None):
+        """Move up to ``n`` oldest pending jobs to ``running`` and return them.
+
+        Pop and state change run as one Lua script, so no two workers get the
+        same job and none is lost between the two.
+        """
+        job_ids = self._claim(
+            keys=[self._key('pending'), self._key('running')],
+            args=[n, self._key('job', ''), RUNNING, worker_id or '', time.time()],
+        )
+        return [job for job in map(self.get, job_ids) if job is not None]
+
+    def _finish(self, job_id, fields):
+        key = self._key('job', job_id)
+        pipe = self._redis.pipeline()
+        pipe.hset(key, mapping={**fields, 'updated_at': time.time()})
+        pipe.srem(self._key('running'), job_id)
+        pipe.incr(self._key('count', fields['status']))
+        pipe.expire(key, RESULT_TTL)
+        pipe.execute()
+
+    def complete(self, job_id, result):
+        self._finish(job_id, {'status': SUCCEEDED, 'result': json.dumps(result)})
+
+    def fail(self, job_id, error, error_code=None):
+        """Mark a job as failed with an error message and optional HTTP status code."""
+        fields = {'status': FAILED, 'error': str(error)}
+        if error_code is not None:
+            fields['error_code'] = error_code
+        self._finish(job_id, fields)
+
+    def requeue(self, job_id):
+        """Put a running job back on the queue to be retried; True if it was running."""
+        return self._requeue([job_id]) > 0
+
+    def get(self, job_id):
+        return self._to_dict(self._redis.hgetall(self._key('job', job_id)))
+
+    def count(self, status=PENDING):
+        if status == PENDING:
+            return self._redis.llen(self._key('pending'))
+        if status == RUNNING:
+            return self._redis.scard(self._key('running'))
+        # Finished jobs expire, so these are running totals rather than current rows
+        return int(self._redis.get(self._key('count', status)) or 0)
+
+    def purge_finished(self, older_than):
+        """Finished jobs expire on their own after RESULT_TTL; nothing to delete."""
+        return 0
+
+    def _requeue(self, job_ids):
+        requeued = 0
+        for job_id in job_ids:
+            job = self.get(job_id)
+            if job is None:
+                self._redis.srem(self._key('running'), job_id)
+            elif job['attempts'] >= self.max_attempts:
+                self._finish(job_id, {'status': FAILED, 'error': "Exceeded maximum attempts"})
+            elif self._redis.srem(self._key('running'), job_id):
+                # Only whoever removed it from ``running`` puts it back
+                pipe = self._redis.pipeline()
+                pipe.hset(self._key('job', job_id), mapping={'status': PENDING, 'worker': '', 'updated_at': time.time()})
+                pipe.rpush(self._key('pending'), job_id)
+                pipe.execute()
+                requeued += 1
+        return requeued
+
+    def recover_running(self):
+        """Requeue every running job (the only consumer has restarted)."""
+        requeued = self._requeue(self._redis.smembers(self._key('running')))
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted job(s)")
+        return requeued
+
+    def requeue_orphaned(self, stale_after):
+        """Requeue running jobs whose worker has not heartbeated for ``stale_after`` seconds.
+
+        Workers silent for WORKER_RETENTION times that long are deregistered.
+        """
+        cutoff = time.time() - stale_after
+        live = {w['id'] for w in self.workers() if w['heartbeat_at'] >= cutoff}
+        orphaned = []
+        for job_id in self._redis.smembers(self._key('running')):
+            worker = self._redis.hget(self._key('job', job_id), 'worker')
+            if worker and worker not in live:
+                orphaned.append(job_id)
+        requeued = self._requeue(orphaned)
+        if requeued:
+            logger.info(f"Requeued {requeued} job(s) from unresponsive workers")
+        gone = [w['id'] for w in self.workers() if w['heartbeat_at'] < time.time() - stale_after * WORKER_RETENTION]
+        if gone:
+            self._redis.hdel(self._key('workers'), *gone)
+        return requeued
+
+    def heartbeat(self, worker_id, info):
+        """Record that ``worker_id`` is alive, with a JSON-serialisable status dict."""
+        self._redis.hset(self._key('workers'), worker_id, json.dumps({**info, 'heartbeat_at': time.time()}))
+
+    def remove_worker(self, worker_id):
+        self._redis.hdel(self._key('workers'), worker_id)
+
+    def workers(self):
+        """Every registered worker's last status, with ``id`` and ``heartbeat_at``."""
+        return [
+            {'id': worker_id, **json.loads(info)}
+            for worker_id, info in sorted(self._redis.hgetall(self._key('workers')).items())
+        ]
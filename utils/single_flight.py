@@ -0,0 +1,90 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into a single execution.
+
+    The first caller for a key (the leader) runs the work; callers arriving
+    while it is still in flight wait for and receive the leader's result or
+    exception. Nothing is cached: once the leader finishes, the next call
+    with that key runs again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = set()  # Strong references to running async leaders
+        self.executions = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+            call = Future()
+            self._calls[key] = call
+            self.executions += 1
+            return call, True
+
+    def _finish(self, key, call, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if call.done():  # Cancelled: nobody is waiting for the outcome
+            return
+        if error is not None:
+            call.set_exception(error)
+        else:
+            call.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run ``fn`` for ``key`` unless an identical call is already in flight."""
+        call, leader = self._join(key)
+        if not leader:
+            return call.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, call, error=e)
+            raise
+        self._finish(key, call, result=result)
+        return result
+
+    async def do_async(self, key, coro_fn):
+        """Async variant of ``do``: ``coro_fn`` is a zero-argument coroutine function.
+
+        The work runs as a task of its own rather than in the leader's request,
+        and every caller waits on it through ``asyncio.shield``: cancelling any
+        one caller, leader included, only stops that caller waiting.
+        """
+        call, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(self._lead(key, call, coro_fn))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return await asyncio.shield(asyncio.wrap_future(call))
+
+    async def _lead(self, key, call, coro_fn):
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            # Only at event loop shutdown; the waiters are being cancelled too
+            with self._lock:
+                self._calls.pop(key, None)
+            call.cancel()
+            raise
+        except BaseException as e:
+            self._finish(key, call, error=e)
+            return
+        self._finish(key, call, result=result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
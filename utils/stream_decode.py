@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Bytes a ByteStream holds for its reader before the producer has to wait
+MAX_BUFFERED_BYTES = 8 << 20
+
+
+class StreamingUnsupported(Exception):
+    """The container cannot be demuxed from a non-seekable byte stream.
+
+    Typically an MP4 whose ``moov`` index comes after the media data; the
+    caller should fall back to decoding the complete upload from disk.
+    """
+
+
+class ByteStream:
+    """Blocking, non-seekable file-like reader fed from another thread.
+
+    The producer (an upload being received) calls ``feed`` and finally
+    ``close``; the consumer (PyAV, in a worker thread) calls ``read``, which
+    blocks until bytes arrive. Once the consumer has what it needs it calls
+    ``discard`` so the rest of the upload is not buffered. The object has no
+    ``seek``, so FFmpeg treats it as a pipe.
+
+    At most about ``max_buffered`` bytes are held: while the reader is not
+    consuming (e.g. waiting for memory admission), ``has_room`` turns false
+    and the producer should await ``wait_for_room`` before feeding more,
+    which pushes back on the upload instead of buffering it in RAM.
+    """
+
+    def __init__(self, max_buffered=MAX_BUFFERED_BYTES):
+        self.max_buffered = max_buffered
+        self._buffered = 0
+        self._chunks = deque()
+        self._offset = 0
+        self._eof = False
+        self._error = None
+        self._discarding = False
+        self._cond = threading.Condition()
+        self._room_waiters = []  # (loop, future) of producers awaiting wait_for_room
+
+    def feed(self, data):
+        with self._cond:
+            if self._discarding or self._eof:
+                return
+            self._chunks.append(data)
+            self._buffered += len(data)
+            self._cond.notify_all()
+
+    def _has_room(self):
+        return self._buffered < self.max_buffered or self._discarding or self._eof
+
+    def has_room(self):
+        with self._cond:
+            return self._has_room()
+
+    async def wait_for_room(self):
+        """Wait until the reader has drained the buffer below ``max_buffered`` or stopped reading.
+
+        A coroutine, so a producer on the event loop does not tie up a thread
+        while the reader is behind.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._has_room():
+                    return
+                ready = loop.create_future()
+                self._room_waiters.append((loop, ready))
+            await ready
+
+    def _notify(self):
+        # Called with the lock held, after any change that may make room
+        self._cond.notify_all()
+        if self._room_waiters and self._has_room():
+            for loop, ready in self._room_waiters:
+                try:
+                    loop.call_soon_threadsafe(_set_ready, ready)
+                except RuntimeError:  # Loop already closed; nobody is waiting
+                    pass
+            self._room_waiters.clear()
+
+    def close(self, error=None):
+        """Signal end of input; with ``error``, make pending and future reads raise it."""
+        with self._cond:
+            self._eof = True
+            if error is not None and self._error is None:
+                self._error = error
+            self._notify()
+
+    def discard(self):
+        """The reader is done: drop buffered bytes and ignore further ``feed`` calls."""
+        with self._cond:
+            self._discarding = True
+            self._chunks.clear()
+            self._buffered = 0
+            self._notify()
+
+    def read(self, size=-1):
+        with self._cond:
+            while not self._chunks and not self._eof and not self._discarding and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+            if not self._chunks:
+                return b''
+            out = bytearray()
+            while self._chunks and (size < 0 or len(out) < size):
+                chunk = self._chunks[0]
+                end = len(chunk) if size < 0 else self._offset + size - len(out)
+                piece = chunk[self._offset:end]
+                out += piece
+                self._offset += len(piece)
+                self._buffered -= len(piece)
+                if self._offset >= len(chunk):
+                    self._chunks.popleft()
+                    self._offset = 0
+            self._notify()
+            return bytes(out)
+
+
+def _set_ready(future):
+    if not future.done():
+        future.set_result(None)
+
+
+@contextmanager
+def open_stream(source):
+    """Open a PyAV container on ``source``, reading only as far as the headers."""
+    import av
+
+    try:
+        container = av.open(source, mode='r')
+    except av.error.FFmpegError as e:
+        raise StreamingUnsupported(f"Cannot demux stream: {str(e)}")
+    try:
+        yield container
+    finally:
+        container.close()
+
+
+class DecimatingReservoir:
+    """Evenly spaced sample of a sequence of unknown length in bounded memory.
+
+    Keeps every ``stride``-th item; whenever ``capacity`` items are held,
+    every other one is dropped and the stride doubles, so the kept items
+    always span the whole sequence seen so far at an even spacing.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(2, capacity)
+        self.stride = 1
+        self.items = []
+
+    def wants(self, index):
+        return index % self.stride == 0
+
+    def add(self, item):
+        self.items.append(item)
+        if len(self.items) >= self.capacity:
+            self.items = self.items[::2]
+            self.stride *= 2
+
+
+def sample_stream_frames(container, num_frames, frame_size, total_frames=0, motion_crop=False, crop_margin=0.15):
+    """Decode ``num_frames`` frames resized to ``frame_size`` as packets arrive.
+
+    With a known ``total_frames`` the same uniform indices as
+    ``utils.video_utils.decode_frames`` are picked, and decoding stops once
+    the last one is reached. Otherwise a ``DecimatingReservoir`` keeps an
+    evenly spaced subset of the frames seen and ``num_frames`` are picked
+    from it at the end. Only selected frames are converted to RGB and resized;
+    with ``motion_crop`` they are kept at full resolution and cropped with
+    ``utils.motion_crop.crop_to_motion`` once all are known.
+
+    Returns:
+        np.ndarray: uint8 frames of shape (T, H, W, C)
+    """
+    import av
+    import cv2
+    import numpy as np
+    from utils.motion_crop import crop_to_motion
+
+    stream = container.streams.video[0]
+    stream.thread_type = 'AUTO'
+
+    def convert(frame):
+        rgb = frame.to_ndarray(format='rgb24')
+        return rgb if motion_crop else cv2.resize(rgb, (frame_size, frame_size))
+
+    if total_frames > 0:
+        if total_frames <= num_frames:
+            frame_indices = list(range(total_frames))
+        else:
+            frame_indices = np.linspace(0, total_frames - 1, num_frames, dtype=int).tolist()
+        targets = set(frame_indices)
+        last_target = frame_indices[-1]
+        picked = {}
+        reservoir = None
+    else:
+        reservoir = DecimatingReservoir(2 * num_frames)
+
+    try:
+        for index, frame in enumerate(container.decode(stream)):
+            if reservoir is not None:
+                if reservoir.wants(index):
+                    reservoir.add(convert(frame))
+            elif index in targets:
+                picked[index] = convert(frame)
+                if index == last_target:
+                    break
+    except av.error.FFmpegError as e:
+        raise StreamingUnsupported(f"Cannot decode stream: {str(e)}")
+
+    if reservoir is not None:
+        kept = reservoir.items
+        if len(kept) > num_frames:
+            kept = [kept[i] for i in np.linspace(0, len(kept) - 1, num_frames, dtype=int)]
+    else:
+        # The container's count may be an estimate; use what was actually decoded
+        kept = [picked[i] for i in frame_indices if i in picked]
+    if not kept:
+        raise StreamingUnsupported("No frames decoded from stream")
+    while len(kept) < num_frames:
+        kept.append(kept[-1])
+    if motion_crop:
+        return crop_to_motion(kept, frame_size, margin=crop_margin)
+    return np.stack(kept)
@@ -0,0 +1,44 @@
+# In the order views are added as more are requested
+TTA_VIEWS = ('identity', 'hflip', 'temporal_shift', 'center_crop')
+# Side of the center crop as a fraction of the frame, resized back to full size
+CENTER_CROP_FRACTION = 0.9
+
+
+def _temporal_shift(video):
+    import torch
+
+    # One frame later, repeating the last frame at the end
+    t = video.shape[2]
+    index = torch.clamp(torch.arange(1, t + 1), max=t - 1)
+    return video.index_select(2, index)
+
+
+def _center_crop(video):
+    import torch.nn.functional as F
+
+    _, _, t, h, w = video.shape
+    ch, cw = max(1, round(h * CENTER_CROP_FRACTION)), max(1, round(w * CENTER_CROP_FRACTION))
+    y0, x0 = (h - ch) // 2, (w - cw) // 2
+    crop = video[..., y0:y0 + ch, x0:x0 + cw]
+    return F.interpolate(crop, size=(t, h, w), mode='trilinear', align_corners=False)
+
+
+def build_views(video, num_views):
+    """Stack the first ``num_views`` of ``TTA_VIEWS`` of a normalized (1, C, T, H, W) clip.
+
+    Views are tensor ops on the already decoded clip, so N views cost one
+    decode plus one N-sample forward pass.
+
+    Returns:
+        (batch, names): the stacked views and their names
+    """
+    import torch
+
+    transforms = {
+        'identity': lambda v: v,
+        'hflip': lambda v: v.flip(4),
+        'temporal_shift': _temporal_shift,
+        'center_crop': _center_crop,
+    }
+    names = TTA_VIEWS[:max(1, min(num_views, len(TTA_VIEWS)))]
+    return torch.cat([transforms[name](video) for name in names]), list(names)
@@ -13,23 +13,29 @@ except ImportError:
     VideoReader = None
     _VIDEO_DEPS_AVAILABLE = False
 
-import gc
+from app.config import NUM_FRAMES, FRAME_SIZE, CHUNK_SIZE, MOTION_CROP, MOTION_CROP_MARGIN
+from utils.motion_crop import crop_to_motion
+from utils.precision import resolve_memory_format
 
 logger = logging.getLogger(__name__)
 
-def process_video(video_path, num_frames=16, frame_size=224, chunk_size=4):
+# ImageNet normalization statistics, in channel-last (..., C) order
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def decode_frames(video_path, num_frames=NUM_FRAMES, frame_size=FRAME_SIZE, chunk_size=CHUNK_SIZE,
+                  motion_crop=MOTION_CROP, crop_margin=MOTION_CROP_MARGIN):
     """
-    Process video with memory optimization.
+    Decode ``num_frames`` uniformly sampled frames resized to ``frame_size``.
     Streams frames in chunks instead of loading all at once.
-    
-    Args:
-        video_path: Path to video file
-        num_frames: Number of frames to extract
-        frame_size: Size to resize frames to
-        chunk_size: Process frames in batches of this size
-    
+
+    With ``motion_crop`` the sampled full-resolution frames are kept until
+    all are decoded, then cropped to one box around the moving subject
+    (``utils.motion_crop.crop_to_motion``) before resizing.
+
     Returns:
-        torch.Tensor: Normalized video tensor (1, C, T, H, W)
+        np.ndarray: uint8 frames of shape (T, H, W, C)
     """
     if not _VIDEO_DEPS_AVAILABLE:
         raise RuntimeError("Video dependencies (torch, cv2, numpy, decord) are required")
@@ -45,32 +51,62 @@ def process_video(video_path, num_frames=16, frame_size=224, chunk_size=4):
         frame_indices = np.linspace(0, total_frames-1, num_frames, dtype=int)
 
     # Process frames in chunks to minimize memory usage
-    frames_list = []
+    frames = np.empty((len(frame_indices), frame_size, frame_size, 3), dtype=np.uint8)
+    full_frames = []
     for i in range(0, len(frame_indices), chunk_size):
         batch_indices = frame_indices[i:i+chunk_size]
-        frames = vr.get_batch(batch_indices).asnumpy()
-        
-        resized_frames = [cv2.resize(f, (frame_size, frame_size)) for f in frames]
-        frames_list.extend(resized_frames)
+        batch = vr.get_batch(batch_indices).asnumpy()
+
+        if motion_crop:
+            # The crop box needs every sampled frame
+            full_frames.extend(batch)
+            continue
+        for j, f in enumerate(batch):
+            frames[i + j] = cv2.resize(f, (frame_size, frame_size))
         
-        # Clear intermediate data
-        del frames
-        gc.collect()
-    
-    frames = np.array(frames_list)
-    
-    # Normalize to float in range [0, 1]
-    tensor = torch.from_numpy(frames).permute(3,0,1,2).float()
-    if tensor.max() > 1.0:
-        tensor = tensor / 255.0
-
-    # Apply ImageNet normalization
-    mean = torch.tensor([0.485,0.456,0.406]).view(3,1,1,1)
-    std = torch.tensor([0.229,0.224,0.225]).view(3,1,1,1)
-    tensor = (tensor - mean) / std
+        # Drop the full-resolution chunk before decoding the next one
+        del batch
+
+    if motion_crop:
+        return crop_to_motion(full_frames, frame_size, margin=crop_margin)
+    return frames
+
+
+def frames_to_tensor(frames, memory_format='contiguous'):
+    """
+    Normalize uint8 (T, H, W, C) frames into a (1, C, T, H, W) float tensor.
+    A stacked (B, T, H, W, C) batch gives a (B, C, T, H, W) tensor.
+
+    Normalization runs in the decoded channel-last order, so the permuted
+    result is already laid out as ``channels_last_3d`` with no extra copy;
+    ``contiguous`` layout costs one copy at the end.
+    """
+    tensor = torch.as_tensor(frames)
+    if tensor.dim() == 4:
+        tensor = tensor.unsqueeze(0)
+    mean = torch.tensor(IMAGENET_MEAN)
+    std = torch.tensor(IMAGENET_STD)
+    # (x / 255 - mean) / std folded into one multiply and one subtract
+    tensor = tensor.float().mul_(1.0 / (255.0 * std)).sub_(mean / std)
+    tensor = tensor.permute(0, 4, 1, 2, 3)
+    return tensor.contiguous(memory_format=resolve_memory_format(memory_format))
+
+
+def process_video(video_path, num_frames=NUM_FRAMES, frame_size=FRAME_SIZE, chunk_size=CHUNK_SIZE,
+                  memory_format='contiguous'):
+    """
+    Process video with memory optimization.
+    Streams frames in chunks instead of loading all at once.
     
-    # Cleanup
-    del frames
-    gc.collect()
+    Args:
+        video_path: Path to video file
+        num_frames: Number of frames to extract
+        frame_size: Size to resize frames to
+        chunk_size: Process frames in batches of this size
+        memory_format: 'contiguous' (NCDHW) or 'channels_last_3d' (NDHWC storage)
     
-    return tensor.unsqueeze(0)  # Add batch dimension
+    Returns:
+        torch.Tensor: Normalized video tensor (1, C, T, H, W)
+    """
+    frames = decode_frames(video_path, num_frames=num_frames, frame_size=frame_size, chunk_size=chunk_size)
+    return frames_to_tensor(frames, memory_format=memory_format)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Inference worker processes for INFERENCE_BACKEND=queue.
+
+Each process loads the model once (``InferenceEngine``, built on
+``load_student_model``) and keeps up to ``--batch-size`` jobs from the queue
+/predict and /jobs write to running at a time, claiming another as soon as
+one finishes, so the engine's micro-batcher executes their forward passes
+together. Processes heartbeat their state and counters into the queue (see
+``GET /workers``); running jobs of a worker that stops heartbeating are
+requeued by the others. Run it on as many nodes as needed: with a Redis
+``BROKER_URL`` and JOB_UPLOAD_DIR on shared storage, throughput scales with
+the worker count.
+
+Usage:
+    INFERENCE_BACKEND=queue uvicorn main:app --port 8000
+    python worker.py --processes 4 --batch-size 4
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from api.jobs import get_job_queue, purge_finished_jobs, _process_job
+from app.config import (
+    INFERENCE_WORKERS, WORKER_BATCH_SIZE, WORKER_HEARTBEAT_INTERVAL, WORKER_HEARTBEAT_TIMEOUT,
+    JOB_POLL_INTERVAL, TORCH_NUM_THREADS, MEMORY_LIMIT_MB,
+)
+from models.engine import get_engine
+from utils.admission import MB, memory_limit_bytes
+
+logger = logging.getLogger('worker')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=INFERENCE_WORKERS,
+                        help='Worker processes on this node (default: INFERENCE_WORKERS)')
+    parser.add_argument('--batch-size', type=int, default=WORKER_BATCH_SIZE,
+                        help='Jobs claimed and run together per process (default: WORKER_BATCH_SIZE)')
+    return parser.parse_args()
+
+
+class Worker:
+    """One inference process: keep up to ``batch_size`` claimed jobs running."""
+
+    def __init__(self, batch_size):
+        self.batch_size = max(1, batch_size)
+        self.queue = get_job_queue()
+        self.id = f"{socket.gethostname()}-{os.getpid()}"
+        self.started_at = time.time()
+        self.state = 'loading'
+        self.stop = threading.Event()
+        self._stats = {'processed': 0, 'failed': 0, 'batches': 0}
+        self._stats_lock = threading.Lock()
+
+    def heartbeat(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        engine = get_engine()
+        self.queue.heartbeat(self.id, {
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'state': self.state,
+            'started_at': self.started_at,
+            'batch_size': self.batch_size,
+            **stats,
+            'engine': engine.metrics() if engine.ready else None,
+        })
+
+    def _heartbeat_loop(self):
+        while not self.stop.wait(WORKER_HEARTBEAT_INTERVAL):
+            try:
+                self.heartbeat()
+                self.queue.requeue_orphaned(WORKER_HEARTBEAT_TIMEOUT)
+                purge_finished_jobs(self.queue)
+            except Exception as e:
+                logger.warning(f"Heartbeat failed: {str(e)}")
+
+    def _record(self, done):
+        outcomes = []
+        for future in done:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                logger.error(f"Job processing failed: {str(e)}", exc_info=True)
+                outcomes.append(False)
+        with self._stats_lock:
+            self._stats['processed'] += sum(outcomes)
+            self._stats['failed'] += len(outcomes) - sum(outcomes)
+
+    def run(self):
+        # Registered before claiming anything, so peers never see our jobs as orphaned
+        self.heartbeat()
+        threading.Thread(target=self._heartbeat_loop, name='heartbeat', daemon=True).start()
+        get_engine().load()
+        self.state = 'idle'
+        logger.info(f"Worker {self.id} ready (batch size {self.batch_size})")
+
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.batch_size, thread_name_prefix='job') as pool:
+            while not self.stop.is_set():
+                # Refill free slots right away rather than after the whole batch,
+                # so one slow clip does not idle the others
+                free = self.batch_size - len(running)
+                try:
+                    jobs = self.queue.claim_batch(free, worker_id=self.id) if free else []
+                except Exception as e:
+                    logger.error(f"Failed to claim jobs: {str(e)}", exc_info=True)
+                    jobs = []
+                if jobs:
+                    with self._stats_lock:
+                        self._stats['batches'] += 1
+                # Concurrent predict calls meet in the engine's micro-batcher
+                running.update(pool.submit(_process_job, self.queue, job) for job in jobs)
+                if not running:
+                    self.state = 'idle'
+                    self.stop.wait(JOB_POLL_INTERVAL)
+                    continue
+                self.state = 'busy'
+                # With free slots left the queue is empty: poll it again meanwhile
+                timeout = None if len(running) >= self.batch_size else JOB_POLL_INTERVAL
+                done, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                self._record(done)
+            # Finish the jobs in hand before deregistering
+            done, running = wait(running)
+            self._record(done)
+
+        self.queue.remove_worker(self.id)
+        logger.info(f"Worker {self.id} stopped")
+
+
+def run_worker(batch_size):
+    """Entry point of each spawned process."""
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s [{os.getpid()}] %(name)s: %(message)s')
+    worker = Worker(batch_size)
+    # Finish the jobs in hand, then exit
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: worker.stop.set())
+    try:
+        worker.run()
+    except Exception:
+        logger.exception(f"Worker {worker.id} crashed")
+        # Deregistered, its running jobs are requeued at a peer's next heartbeat
+        worker.queue.remove_worker(worker.id)
+        raise
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    num_processes = max(1, args.processes)
+
+    # Read by app.config when each spawned child imports it: split the cores and
+    # the memory limit between the processes, and let the micro-batcher group a
+    # whole claimed batch. Each process's admission only sees its own RSS, so
+    # with the full limit each, N processes could admit N times the node's memory.
+    if TORCH_NUM_THREADS <= 0:
+        os.environ['TORCH_NUM_THREADS'] = str(max(1, (os.cpu_count() or 1) // num_processes))
+    limit_mb = MEMORY_LIMIT_MB if MEMORY_LIMIT_MB > 0 else memory_limit_bytes() // MB
+    os.environ['MEMORY_LIMIT_MB'] = str(max(1, limit_mb // num_processes))
+    os.environ['MAX_BATCH_SIZE'] = str(max(1, args.batch_size))
+
+    # spawn, not fork: torch and the decoder threads do not survive a fork
+    ctx = multiprocessing.get_context('spawn')
+    stopping = threading.Event()
+
+    def start():
+        p = ctx.Process(target=run_worker, args=(args.batch_size,), daemon=False)
+        p.start()
+        return p
+
+    def request_stop(*_):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    processes = [start() for _ in range(num_processes)]
+    logger.info(f"Started {num_processes} inference worker process(es)")
+    while not stopping.wait(1.0):
+        for i, p in enumerate(processes):
+            if not p.is_alive():
+                logger.warning(f"Worker process {p.pid} exited with code {p.exitcode}; restarting")
+                processes[i] = start()
+
+    for p in processes:
+        if p.is_alive():
+            p.terminate()
+    for p in processes:
+        p.join(60)
+        if p.is_alive():
+            p.kill()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())